@@ -0,0 +1,47 @@
+"""
+Compare document-number detection speed of full extract_text() against the fast header detector.
+
+Usage: python -m benchmarks.detector_benchmark <pdf> [<pdf> ...] [--max-text-ops N] [--header-region F]
+"""
+import argparse
+import time
+
+from PyPDF2 import PdfReader
+
+from pdf_processor import detect_document_number
+
+
+def time_detection(pdf_path, fast_detection, max_text_ops, header_region):
+    # A fresh reader per run so neither mode benefits from the other's decoded-stream cache.
+    reader = PdfReader(pdf_path)
+    start = time.perf_counter()
+    results = [
+        detect_document_number(page, fast_detection, max_text_ops, header_region)[0]
+        for page in reader.pages
+    ]
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--max-text-ops", type=int, default=60)
+    parser.add_argument("--header-region", type=float, default=None)
+    args = parser.parse_args()
+
+    for pdf_path in args.pdfs:
+        full_results, full_time = time_detection(pdf_path, False, args.max_text_ops, args.header_region)
+        fast_results, fast_time = time_detection(pdf_path, True, args.max_text_ops, args.header_region)
+        pages = len(full_results)
+        disagreements = [i for i, (a, b) in enumerate(zip(full_results, fast_results)) if a != b]
+        print(f"{pdf_path}: {pages} pages")
+        print(f"  full extract_text : {pages / full_time:8.1f} pages/sec ({full_time:.2f}s)")
+        print(f"  fast detector     : {pages / fast_time:8.1f} pages/sec ({fast_time:.2f}s)")
+        print(f"  speed-up          : {full_time / fast_time:8.1f}x")
+        if disagreements:
+            print(f"  WARNING: {len(disagreements)} pages disagree, first at page index {disagreements[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Peak memory of a full run against input size, with and without low_memory.
+
+Usage: python -m benchmarks.memory_benchmark [--documents 250 1000 4000] [--images 2]
+
+Each measurement runs process_pdfs in a fresh interpreter. It reports the peak Python heap
+(tracemalloc) and, where the OS provides it, the peak resident set size. Pages of a
+memory-mapped input that have been read count towards RSS. The OS can drop them at any time,
+so the heap is the figure to watch. With low_memory it should grow only by the per-page
+bookkeeping (cross-reference table, run and match reports), not by the pages themselves.
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.synthetic import write_month
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = """
+import json, sys, tracemalloc
+sys.path.insert(0, {root!r})
+from pdf_processor import PDFProcessor
+tracemalloc.start()
+PDFProcessor({input_dir!r}, output_dir={output_dir!r}, use_page_index=False, write_report=False,
+             low_memory={low_memory!r}).process_pdfs()
+result = {{'heap_peak': tracemalloc.get_traced_memory()[1]}}
+try:
+    import resource
+    # Kilobytes on Linux, bytes on macOS.
+    scale = 1 if sys.platform == 'darwin' else 1024
+    result['rss_peak'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+except ImportError:
+    pass
+print(json.dumps(result))
+"""
+
+
+def measure(input_dir: str, output_dir: str, low_memory: bool) -> dict:
+    shutil.rmtree(output_dir, ignore_errors=True)
+    code = _CHILD.format(root=ROOT, input_dir=input_dir, output_dir=output_dir, low_memory=low_memory)
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, nargs='+', default=[250, 1000, 4000])
+    parser.add_argument('--images', type=int, default=2, help="unshared logo images per page")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="merger_memory_")
+    try:
+        print(f"{'documents':>9} {'input MB':>9} {'mode':>10} {'heap MB':>9} {'RSS MB':>8}")
+        for documents in args.documents:
+            input_dir = os.path.join(work_dir, f"input_{documents}")
+            paths = write_month(input_dir, documents=documents, images=args.images, shared_images=False)
+            input_mb = sum(os.path.getsize(path) for path in paths) / 1e6
+            for low_memory in (False, True):
+                result = measure(input_dir, os.path.join(work_dir, "output"), low_memory)
+                rss = f"{result['rss_peak'] / 1e6:8.1f}" if 'rss_peak' in result else f"{'-':>8}"
+                print(f"{documents:9d} {input_mb:9.1f} {'low' if low_memory else 'default':>10} "
+                      f"{result['heap_peak'] / 1e6:9.1f} {rss}", flush=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
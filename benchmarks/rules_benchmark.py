@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of field extraction from page text: the combined extraction rules against the
+previous document-number search followed by a "Bill To" line scan on header pages. Page text is
+extracted once up front, so only the matching itself is timed.
+
+Usage: python -m benchmarks.rules_benchmark [--documents N] [--rules FILE] [--repeat N]
+"""
+import os
+import re
+import argparse
+import tempfile
+import time
+
+from PyPDF2 import PdfReader
+
+from benchmarks.synthetic import write_month
+from utils.extraction_rules import DEFAULT_RULES, ExtractionRules
+
+LEGACY_PATTERN = re.compile(r'(?:Invoice #|Affidavit)\s*(\d{4}-\d{3})')
+
+
+def legacy_extract(text):
+    """What detection did before the rules: the customer line was looked for on every header page."""
+    doc_match = LEGACY_PATTERN.search(text)
+    if not doc_match:
+        return None, None
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if "Bill To" in line:
+            return doc_match.group(1), (lines[i + 1].strip() if i + 1 < len(lines) else None)
+    return doc_match.group(1), None
+
+
+def rules_extract(rules):
+    def extract(text):
+        fields = rules.extract(text)
+        return fields.document_number, fields.customer
+    return extract
+
+
+def page_texts(documents):
+    with tempfile.TemporaryDirectory() as tmp:
+        texts = []
+        for pdf_path in write_month(tmp, documents=documents):
+            texts.extend(page.extract_text() for page in PdfReader(pdf_path).pages)
+    return texts
+
+
+def time_extract(extract, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [extract(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--rules", help="rules file to time as well as the defaults")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = page_texts(args.documents)
+    print(f"{len(texts)} pages of text, {sum(map(len, texts)) / len(texts):.0f} characters each on average")
+    legacy_results, legacy_time = time_extract(legacy_extract, texts, args.repeat)
+    print(f"  search + line scan          : {legacy_time / len(texts) * 1e6:6.2f} us/page")
+    candidates = [("default rules", ExtractionRules(DEFAULT_RULES))]
+    if args.rules:
+        candidates.append((os.path.basename(args.rules), ExtractionRules.load(args.rules)))
+    for name, rules in candidates:
+        results, elapsed = time_extract(rules_extract(rules), texts, args.repeat)
+        print(f"  {name:<27} : {elapsed / len(texts) * 1e6:6.2f} us/page ({legacy_time / elapsed:.2f}x)")
+        if name == "default rules" and results != legacy_results:
+            disagreements = [i for i, (a, b) in enumerate(zip(legacy_results, results)) if a != b]
+            print(f"  WARNING: {len(disagreements)} pages disagree, first at page index {disagreements[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark the extraction, customer lookup and merge stages on synthetic months.
+
+Usage: python -m benchmarks.run_benchmarks [--documents N] [--invoice-pages N] [--affidavit-pages N]
+           [--fonts N] [--images N] [--unshared-images] [--output results.json] [--compare old.json]
+
+Each stage is timed without tracing, then run again under tracemalloc for its peak Python
+memory. Results are saved as JSON; --compare prints the change against an earlier result file.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+import PyPDF2
+
+from benchmarks.synthetic import STANDARD_FONTS, write_month
+from pdf_processor import PDFProcessor
+from utils.pdf_cache import clear_cache, open_pdf
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _measure(stage, trace_memory: bool):
+    """Run stage() from a cold parse cache; return (result, seconds, peak traced bytes or None)."""
+    clear_cache()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = stage()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run(args) -> dict:
+    work_dir = tempfile.mkdtemp(prefix="merger_bench_")
+    try:
+        input_dir = os.path.join(work_dir, "input")
+        invoice_file, affidavit_file = write_month(
+            input_dir, documents=args.documents, invoice_pages=args.invoice_pages,
+            affidavit_pages=args.affidavit_pages, fonts=STANDARD_FONTS[:args.fonts], images=args.images,
+            shared_images=not args.unshared_images,
+        )
+        invoice_pages = args.documents * args.invoice_pages
+        affidavit_pages = args.documents * args.affidavit_pages
+        output_dir = os.path.join(work_dir, "output")
+
+        def processor(output_format="files"):
+            return PDFProcessor(input_dir, output_dir=output_dir, workers=args.workers,
+                                writer_workers=args.writer_workers, use_page_index=False,
+                                output_format=output_format)
+
+        def customer_lookup():
+            handle = open_pdf(invoice_file)
+            pdf_processor = processor()
+            for page in range(0, invoice_pages, args.invoice_pages):
+                pdf_processor.extract_customer_info_from_invoice(handle.reader.pages[page].extract_text())
+
+        def merge(output_format="files"):
+            shutil.rmtree(output_dir, ignore_errors=True)
+            return processor(output_format).process_pdfs()[0]
+
+        stages = {
+            'extract_invoices': (lambda: processor().extract_info_from_pdf(invoice_file), invoice_pages),
+            'extract_affidavits': (lambda: processor().extract_info_from_pdf(affidavit_file), affidavit_pages),
+            'customer_lookup': (customer_lookup, args.documents),
+            'process_pdfs': (merge, invoice_pages + affidavit_pages),
+            # The same merge into one ZIP and into one combined PDF, against one file per document.
+            'process_pdfs_zip': (lambda: merge("zip"), invoice_pages + affidavit_pages),
+            'process_pdfs_pdf': (lambda: merge("pdf"), invoice_pages + affidavit_pages),
+        }
+        results = {}
+        for name, (stage, units) in stages.items():
+            result, elapsed, _ = _measure(stage, False)
+            results[name] = {'seconds': round(elapsed, 4), 'per_sec': round(units / elapsed, 1)}
+            if name.startswith('process_pdfs'):
+                results[name]['output_bytes'] = result['bytes_written']
+            if not args.no_memory:
+                _, _, peak = _measure(stage, True)
+                results[name]['peak_memory_bytes'] = peak
+            print(f"{name:20s} {elapsed:8.3f}s {results[name]['per_sec']:10.1f}/s", file=sys.stderr)
+        results['process_pdfs']['input_bytes'] = os.path.getsize(invoice_file) + os.path.getsize(affidavit_file)
+        return results
+    finally:
+        clear_cache()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def compare(current: dict, previous: dict):
+    print(f"Compared with {previous['revision']} ({previous['timestamp']}):")
+    for name, stage in current['stages'].items():
+        old = previous['stages'].get(name)
+        if not old:
+            continue
+        change = (stage['seconds'] - old['seconds']) / old['seconds'] * 100 if old['seconds'] else 0.0
+        print(f"  {name:20s} {old['seconds']:8.3f}s -> {stage['seconds']:8.3f}s ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--invoice-pages", type=int, default=2)
+    parser.add_argument("--affidavit-pages", type=int, default=3)
+    parser.add_argument("--fonts", type=int, default=1, choices=range(1, len(STANDARD_FONTS) + 1))
+    parser.add_argument("--images", type=int, default=1)
+    parser.add_argument("--unshared-images", action="store_true", help="embed a copy of each image per page")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--writer-workers", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec="seconds"),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'pypdf2': PyPDF2.__version__,
+        'platform': platform.platform(),
+        'config': {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        'stages': run(args),
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {output}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
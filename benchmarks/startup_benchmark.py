@@ -0,0 +1,95 @@
+"""
+Measure time-to-first-frame of the GUI, from the source tree or a frozen build.
+
+Usage: python -m benchmarks.startup_benchmark [--frozen dist/Invoice_Merger/Invoice_Merger.exe] [--runs 5]
+
+Each run starts the app with INVOICE_MERGER_STARTUP_PROBE set. The app draws its first frame,
+notes the time and whether PyPDF2 was already loaded, and exits. The reported time is the
+wall clock from launching the process to its exit, so interpreter start-up (or unpacking a
+frozen build) is included. The CLI's --help start-up is measured as well.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from main import STARTUP_PROBE_ENV
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Budgets enforced by test.py, in seconds on an office machine with a warm disk cache.
+GUI_STARTUP_BUDGET = 2.0
+CLI_STARTUP_BUDGET = 1.0
+
+
+def gui_available() -> bool:
+    """The GUI can only be measured with Tk, ttkbootstrap and a display."""
+    try:
+        import tkinter
+        import ttkbootstrap  # noqa: F401
+        tkinter.Tk().destroy()
+    except Exception:
+        return False
+    return True
+
+
+def measure_gui(command, runs: int = 5) -> dict:
+    """Return the median and best launch-to-exit seconds, and whether PyPDF2 loaded before the first frame."""
+    times, pypdf2_loaded = [], False
+    for _ in range(runs):
+        fd, probe = tempfile.mkstemp(suffix=".txt")
+        os.close(fd)
+        try:
+            env = dict(os.environ, **{STARTUP_PROBE_ENV: probe})
+            start = time.perf_counter()
+            subprocess.run(command, cwd=ROOT, env=env, check=True, timeout=120,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+            with open(probe) as f:
+                _, loaded = f.read().split()
+            pypdf2_loaded = pypdf2_loaded or loaded == "1"
+        finally:
+            os.remove(probe)
+    return {'median': round(statistics.median(times), 3), 'best': round(min(times), 3),
+            'pypdf2_before_first_frame': pypdf2_loaded}
+
+
+def measure_cli(runs: int = 5) -> dict:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "cli.py", "--help"], cwd=ROOT, check=True, timeout=60,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {'median': round(statistics.median(times), 3), 'best': round(min(times), 3)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frozen', help="path to a frozen Invoice_Merger executable to measure too")
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {'cli --help': measure_cli(args.runs)}
+    if gui_available():
+        results['gui (source)'] = measure_gui([sys.executable, "main.py"], args.runs)
+    else:
+        print("Tk or a display is not available; skipping the GUI.", file=sys.stderr)
+    if args.frozen:
+        results['gui (frozen)'] = measure_gui([os.path.abspath(args.frozen)], args.runs)
+
+    exit_code = 0
+    for name, result in results.items():
+        budget = CLI_STARTUP_BUDGET if name.startswith("cli") else GUI_STARTUP_BUDGET
+        within = result['median'] <= budget
+        exit_code = exit_code or (0 if within else 1)
+        extra = " (PyPDF2 loaded before the first frame)" if result.get('pypdf2_before_first_frame') else ""
+        print(f"{name:15s} median {result['median']:.3f}s, best {result['best']:.3f}s, "
+              f"budget {budget:.1f}s {'ok' if within else 'EXCEEDED'}{extra}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
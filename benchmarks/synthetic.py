@@ -0,0 +1,181 @@
+"""
+Synthetic invoice and affidavit PDFs shaped like the billing export.
+
+Every document starts with an "Invoice # YYYY-NNN" or "Affidavit YYYY-NNN" header. Invoices
+carry a "Bill To" block with the customer name on the next line. The files are written as raw
+PDF objects, so no PDF library beyond PyPDF2 is needed.
+"""
+import os
+import zlib
+import functools
+from typing import List, Sequence, Tuple
+
+STANDARD_FONTS = ("Helvetica", "Times-Roman", "Courier", "Helvetica-Bold")
+FILLER_LINES = 30
+IMAGE_SIZE = (96, 48)
+
+
+def customer_name(number: int) -> str:
+    return f"Customer {number:03d} Broadcasting LLC"
+
+
+@functools.lru_cache(maxsize=None)
+def _image_stream(variant: int = 0) -> bytes:
+    width, height = IMAGE_SIZE
+    pixels = bytes((x * 7 + y * 3 + variant) % 256 for y in range(height) for x in range(width * 3))
+    data = zlib.compress(pixels)
+    return (b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % (width, height, len(data))
+            + data + b"\nendstream")
+
+
+def _escape(text: str) -> bytes:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1")
+
+
+def _page_lines(kind: str, doc_num: str, number: int, page: int, affidavit_customers: bool = False) -> List[str]:
+    if page == 0 and kind == "invoice":
+        lines = [f"Invoice # {doc_num}", "Bill To", customer_name(number), f"{100 + number} Main Street"]
+    elif page == 0:
+        lines = [f"Affidavit {doc_num}", f"Station KTV{number % 10}", "Certified broadcast schedule"]
+        if affidavit_customers:
+            lines += ["Bill To", customer_name(number)]
+    else:
+        lines = [f"Continued - page {page + 1}", "Spot detail"]
+    lines += [f"{page + 1:02d}/{row + 1:02d} 06:{row:02d}:00 Spot {row} Lorem ipsum dolor sit amet"
+              for row in range(FILLER_LINES)]
+    return lines
+
+
+def build_pdf(kind: str, doc_numbers: Sequence[Tuple[str, int]], pages_per_doc: int,
+              fonts: Sequence[str] = ("Helvetica",), images: int = 0, shared_images: bool = True,
+              compress: bool = True, text_in_forms: bool = False, logo_variant: int = 0,
+              remapped_fonts: bool = False, affidavit_customers: bool = False) -> bytes:
+    """
+    Return the bytes of a PDF with one document per (document number, customer number).
+
+    Each page draws `images` logos. With shared_images they reference one image object per logo;
+    otherwise every page embeds its own copies, as many exporters do. logo_variant changes the
+    logo's pixels. With text_in_forms each page's text is drawn from a form XObject, so every page's
+    own content stream is the same "q /X0 Do Q". With remapped_fonts every character code is one
+    above the character's and each font's ToUnicode CMap maps it back, as subsetting exporters do.
+    With affidavit_customers affidavits carry a "Bill To" block like invoices.
+    """
+    objects: List[bytes] = [b"", b""]  # 1: catalog, 2: page tree; filled in at the end
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    to_unicode = b""
+    if remapped_fonts:
+        cmap = (b"/CIDInit /ProcSet findresource begin 12 dict begin begincmap /CMapName /Shifted def "
+                b"1 begincodespacerange <00> <FF> endcodespacerange "
+                b"1 beginbfrange <21> <7F> <0020> endbfrange endcmap end end")
+        to_unicode = b" /ToUnicode %d 0 R" % add(b"<< /Length %d >>\nstream\n" % len(cmap) + cmap + b"\nendstream")
+    font_ids = [add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding%s >>"
+                    % (font.encode(), to_unicode)) for font in fonts]
+    font_resources = b" ".join(b"/F%d %d 0 R" % (i, font_id) for i, font_id in enumerate(font_ids))
+    shared_image_ids = [add(_image_stream(logo_variant)) for _ in range(images)] if shared_images else []
+
+    def stream_object(content: bytes, dictionary: bytes = b"") -> bytes:
+        if compress:
+            content = zlib.compress(content)
+            dictionary += b" /Filter /FlateDecode"
+        return b"<< %s /Length %d >>\nstream\n" % (dictionary, len(content)) + content + b"\nendstream"
+
+    page_ids = []
+    for doc_num, number in doc_numbers:
+        for page in range(pages_per_doc):
+            ops = [b"BT 14 TL 50 780 Td"]
+            for row, line in enumerate(_page_lines(kind, doc_num, number, page, affidavit_customers)):
+                if remapped_fonts:
+                    line = "".join(chr(ord(char) + 1) for char in line)
+                ops.append(b"/F%d 10 Tf (%s) Tj T*" % (row % len(font_ids), _escape(line)))
+            ops.append(b"ET")
+            xobjects = b""
+            if text_in_forms:
+                form_id = add(stream_object(b"\n".join(ops), b"/Type /XObject /Subtype /Form /BBox [0 0 612 792] "
+                                                          b"/Resources << /Font << %s >> >>" % font_resources))
+                ops = [b"q /X0 Do Q"]
+                xobjects = b"/X0 %d 0 R " % form_id
+            image_ids = shared_image_ids or [add(_image_stream(logo_variant)) for _ in range(images)]
+            for i in range(len(image_ids)):
+                ops.append(b"q 96 0 0 48 %d 730 cm /Im%d Do Q" % (450 - i * 100, i))
+            content_id = add(stream_object(b"\n".join(ops)))
+            xobjects += b" ".join(b"/Im%d %d 0 R" % (i, image_id) for i, image_id in enumerate(image_ids))
+            page_ids.append(add(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                b"/Resources << /Font << %s >> /XObject << %s >> >> >>" % (content_id, font_resources, xobjects)
+            ))
+
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+                  + b"] /Count %d >>" % len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def write_month(folder: str, documents: int = 50, invoice_pages: int = 2, affidavit_pages: int = 3,
+                year: int = 2025, month: int = 1, fonts: Sequence[str] = ("Helvetica",), images: int = 0,
+                shared_images: bool = True, missing_affidavits: int = 0, text_in_forms: bool = False,
+                logo_variant: int = 0, compress: bool = True) -> Tuple[str, str]:
+    """
+    Write "<YYMM>_invoice.pdf" and "<YYMM>_affidavit.pdf" into folder and return their paths.
+
+    The last missing_affidavits documents only appear in the invoice file.
+    """
+    os.makedirs(folder, exist_ok=True)
+    # The document number only has three digits, so large sets roll over into the following years.
+    doc_numbers = [(f"{year + (number - 1) // 999}-{(number - 1) % 999 + 1:03d}", number)
+                   for number in range(1, documents + 1)]
+    prefix = f"{year % 100:02d}{month:02d}"
+    invoice_path = os.path.join(folder, f"{prefix}_invoice.pdf")
+    affidavit_path = os.path.join(folder, f"{prefix}_affidavit.pdf")
+    with open(invoice_path, "wb") as f:
+        f.write(build_pdf("invoice", doc_numbers, invoice_pages, fonts, images, shared_images, compress,
+                          text_in_forms=text_in_forms, logo_variant=logo_variant))
+    with open(affidavit_path, "wb") as f:
+        f.write(build_pdf("affidavit", doc_numbers[:documents - missing_affidavits], affidavit_pages,
+                          fonts, images, shared_images, compress, text_in_forms=text_in_forms,
+                          logo_variant=logo_variant))
+    return invoice_path, affidavit_path
+
+
+def write_split_month(folder: str, documents: int = 50, invoice_parts: int = 2, affidavit_parts: int = 3,
+                      invoice_pages: int = 2, affidavit_pages: int = 3, year: int = 2025,
+                      month: int = 1) -> Tuple[List[str], List[str]]:
+    """
+    Write one month as several invoice and affidavit parts, e.g. "<YYMM>_invoice_part1.pdf".
+
+    Invoices are dealt out over their parts in turn and affidavits in consecutive blocks, so a
+    document's invoice and affidavit are usually in differently numbered parts.
+    """
+    os.makedirs(folder, exist_ok=True)
+    doc_numbers = [(f"{year + (number - 1) // 999}-{(number - 1) % 999 + 1:03d}", number)
+                   for number in range(1, documents + 1)]
+    prefix = f"{year % 100:02d}{month:02d}"
+    block = -(-documents // affidavit_parts)
+    parts = {
+        'invoice': [(doc_numbers[part::invoice_parts], invoice_pages) for part in range(invoice_parts)],
+        'affidavit': [(doc_numbers[part * block:(part + 1) * block], affidavit_pages)
+                      for part in range(affidavit_parts)],
+    }
+    paths = {}
+    for kind, kind_parts in parts.items():
+        paths[kind] = []
+        for part, (numbers, pages) in enumerate(kind_parts, start=1):
+            path = os.path.join(folder, f"{prefix}_{kind}_part{part}.pdf")
+            with open(path, "wb") as f:
+                f.write(build_pdf(kind, numbers, pages))
+            paths[kind].append(path)
+    return paths['invoice'], paths['affidavit']
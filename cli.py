@@ -0,0 +1,220 @@
+# cli.py
+"""
+Headless batch mode: merge invoices and affidavits for many folders or globs of files in one run.
+
+Each input is a folder (processed like the GUI does) or a glob matching invoice and affidavit
+PDFs. The files a glob matches in one folder make one job per month (the first four digits of
+their names, e.g. 2501 in 2501_invoice_part1.pdf), however many parts the export was split into;
+documents are paired by number, not by file name. Jobs are spread over --jobs worker processes.
+A JSON summary is printed on stdout.
+
+Exit codes: 0 all jobs merged cleanly, 1 at least one job failed, 2 document mismatches found.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Optional
+
+from utils.stats import STATS_FILE, StatsTracker
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_MISMATCH = 2
+
+
+def _output_dir(folder: str, output_root: Optional[str], month: Optional[str] = None) -> str:
+    name = f"{month}_output" if month else "output"
+    if output_root:
+        return os.path.join(output_root, f"{os.path.basename(folder)}_{name}" if month else os.path.basename(folder))
+    return os.path.join(folder, name)
+
+
+def discover_jobs(inputs, output_root=None):
+    """Turn folders and globs into job dicts: an input folder, the files a glob matched there, an output folder."""
+    from utils.matching import month_code, split_input_files
+
+    jobs = []
+    for item in inputs:
+        if os.path.isdir(item):
+            folder = os.path.abspath(item)
+            jobs.append({'input_dir': folder, 'input_files': None, 'output_dir': _output_dir(folder, output_root)})
+            continue
+        matches = sorted(path for path in glob.glob(item) if path.lower().endswith('.pdf'))
+        if not matches:
+            logging.error(f"No PDFs match {item}")
+            jobs.append({'input_dir': item, 'input_files': None, 'output_dir': None,
+                         'error': f"No PDFs match {item}"})
+            continue
+        groups = {}
+        for path in matches:
+            path = os.path.abspath(path)
+            groups.setdefault((os.path.dirname(path), month_code(path) or ""), []).append(path)
+        # One job per folder and month (the YYMM code in the file names), with every part of that
+        # month: its invoices and affidavits are paired by document number, whatever the parts are called.
+        for (folder, month), paths in sorted(groups.items()):
+            invoice_files, affidavit_files = split_input_files(paths)
+            if not (invoice_files and affidavit_files):
+                missing = 'affidavit' if invoice_files else 'invoice'
+                jobs.append({'input_dir': folder, 'input_files': None, 'output_dir': None,
+                             'error': f"No {missing} files for {os.path.basename(paths[0])}"})
+                continue
+            jobs.append({'input_dir': folder, 'input_files': tuple(invoice_files + affidavit_files),
+                         'output_dir': _output_dir(folder, output_root, month)})
+    return jobs
+
+
+def _init_worker(log_level: int):
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+
+def run_job(job: dict, options: dict, stats_file: Optional[str] = None, source: str = "cli") -> dict:
+    """Process one job; never raises, so one bad month cannot stop the batch. Logged to stats_file if given."""
+    from pdf_processor import PDFProcessor, ProcessingCancelled
+
+    result = dict(job, status='error', mismatches=None, pages=0, seconds=0.0)
+    if job.get('error'):
+        return result
+    start = time.perf_counter()
+    processor = None
+    try:
+        processor = PDFProcessor(job['input_dir'], output_dir=job['output_dir'],
+                                 input_files=job['input_files'], **options)
+        stats, mismatch_details = processor.process_pdfs()
+        result.update(stats)
+        result['mismatches'] = mismatch_details
+        result['status'] = 'mismatch' if mismatch_details else 'ok'
+    except ProcessingCancelled as e:
+        result['error'] = str(e)
+        result['status'] = 'cancelled'
+    except ValueError as e:
+        # A strict run refuses to merge when the document numbers do not line up.
+        result['error'] = str(e)
+        result['status'] = 'mismatch' if str(e).startswith("Document count mismatch") else 'error'
+    except Exception as e:
+        result['error'] = str(e)
+    if processor is not None:
+        result['input_files'] = processor.found_files
+        # Counted when the run started; opening the inputs again would undo low-memory mode.
+        result['pages'] = processor.progress.pages_total
+        result['report'] = processor.report_path
+        result['output'] = processor.output_path
+        result['stages'] = {name: round(seconds, 4) for name, seconds in processor.report.stages.items()}
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['pages_per_sec'] = round(result['pages'] / result['seconds'], 1) if result['seconds'] else 0.0
+    if stats_file:
+        try:
+            tracker = StatsTracker(stats_file)
+            try:
+                tracker.record_run(source, result['status'], result['seconds'], processor.stats if processor else None,
+                                   result['pages'], result.get('stages'), job['input_dir'], result.get('error'))
+            finally:
+                tracker.close()
+        except Exception as e:
+            logging.error(f"Could not record run statistics in {stats_file}: {e}")
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help="input folders or globs of invoice/affidavit PDFs")
+    parser.add_argument('--output-root', help="write each job's output under this folder")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="jobs processed at once")
+    parser.add_argument('--workers', type=int, default=1, help="extraction processes per job")
+    parser.add_argument('--writer-workers', type=int, default=1, help="writer processes per job")
+    parser.add_argument('--ignore-mismatches', action='store_true', help="merge the common documents anyway")
+    parser.add_argument('--fast', action='store_true', help="fast header-region document-number detection")
+    parser.add_argument('--optimize', action='store_true', help="deduplicate resources in merged outputs")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only rewrite outputs whose source pages changed; resumes interrupted jobs")
+    parser.add_argument('--output-format', choices=('files', 'zip', 'pdf'), default='files',
+                        help="one PDF per document (default), or all of them in one ZIP or one bookmarked PDF")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="memory-map inputs and release pages after scanning; for very large exports")
+    parser.add_argument('--rules', metavar='FILE',
+                        help="document-number and customer rules (default: extraction_rules.json if present)")
+    parser.add_argument('--no-page-index', action='store_true', help="do not use the page index")
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'),
+                        help="profile each job; results go into its run_report.json")
+    parser.add_argument('--stats-file', default=STATS_FILE,
+                        help="run log shared with the GUI (default: %(default)s)")
+    parser.add_argument('--no-stats', action='store_true', help="do not record the runs in the stats file")
+    parser.add_argument('--summary', help="also write the JSON summary to this file")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    if args.incremental and args.output_format != 'files':
+        parser.error("--incremental needs --output-format files")
+    if args.rules:
+        from utils.extraction_rules import ExtractionRules
+        try:
+            ExtractionRules.load(args.rules)
+        except ValueError as e:
+            parser.error(str(e))
+
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    _init_worker(log_level)
+    options = {
+        'ignore_mismatches': args.ignore_mismatches,
+        'workers': args.workers,
+        'writer_workers': args.writer_workers,
+        'fast_detection': args.fast,
+        'optimize_output': args.optimize,
+        'compress_content': args.optimize,
+        'use_page_index': not args.no_page_index,
+        'profile': args.profile,
+        'incremental': args.incremental,
+        'low_memory': args.low_memory,
+        'output_format': args.output_format,
+        'rules_file': os.path.abspath(args.rules) if args.rules else None,
+    }
+
+    jobs = discover_jobs(args.inputs, args.output_root)
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(jobs))), initializer=_init_worker,
+                             initargs=(log_level,)) as executor:
+        stats_file = None if args.no_stats else args.stats_file
+        futures = [executor.submit(run_job, job, options, stats_file) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{result['status']:>8}] {result['input_dir']}: {result.get('processed_count', 0)} documents, "
+                  f"{result['pages']} pages in {result['seconds']:.1f}s ({result['pages_per_sec']} pages/sec)"
+                  + (f" - {result['error']}" if result.get('error') else ""), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    pages = sum(result['pages'] for result in results)
+    summary = {
+        'jobs': len(results),
+        'ok': sum(result['status'] == 'ok' for result in results),
+        'mismatched': sum(result['status'] == 'mismatch' for result in results),
+        'failed': sum(result['status'] == 'error' for result in results),
+        'documents': sum(result.get('processed_count', 0) for result in results),
+        'pages': pages,
+        'seconds': round(elapsed, 3),
+        'pages_per_sec': round(pages / elapsed, 1) if elapsed else 0.0,
+        'results': sorted(results, key=lambda result: str(result['input_dir'])),
+    }
+    print(f"Processed {summary['jobs']} jobs, {pages} pages in {elapsed:.1f}s "
+          f"({summary['pages_per_sec']} pages/sec)", file=sys.stderr)
+    summary_json = json.dumps(summary, indent=4)
+    print(summary_json)
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            f.write(summary_json)
+
+    if summary['failed']:
+        return EXIT_ERROR
+    if summary['mismatched']:
+        return EXIT_MISMATCH
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,72 +1,52 @@
 # gui.py
-import os, time, json, threading, queue, re, logging
+import os, logging
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-from datetime import datetime
-from pdf_processor import PDFProcessor
-from utils.validator import FileValidator
+from job_queue import JobQueue
+from utils.stats import STATS_FILE, StatsTracker
 
-class StatsTracker:
-    def __init__(self, stats_file="merger_stats.json"):
-        self.stats_file = stats_file
-        self.today = datetime.now().strftime("%Y-%m-%d")
-        self.stats = self.load_stats()
-
-    def load_stats(self):
-        try:
-            if os.path.exists(self.stats_file):
-                with open(self.stats_file, 'r') as f:
-                    content = f.read().strip()
-                    if content:
-                        return json.loads(content)
-            default_stats = {self.today: {"processed_count": 0, "error_count": 0, "total_time": 0, "success_rate": 100.0, "total_invoice_balance": 0.0}}
-            with open(self.stats_file, 'w') as f:
-                json.dump(default_stats, f, indent=4)
-            return default_stats
-        except Exception as e:
-            print(f"Error loading stats file: {e}")
-            return {self.today: {"processed_count": 0, "error_count": 0, "total_time": 0, "success_rate": 100.0, "total_invoice_balance": 0.0}}
-
-    def save_stats(self):
-        try:
-            with open(self.stats_file, 'w') as f:
-                json.dump(self.stats, f, indent=4)
-        except Exception as e:
-            print(f"Error saving stats file: {e}")
-
-    def update_processing_stats(self, success, processing_time):
-        if self.today not in self.stats:
-            self.stats[self.today] = {"processed_count": 0, "error_count": 0, "total_time": 0, "success_rate": 100.0, "total_invoice_balance": 0.0}
-        self.stats[self.today]["processed_count"] += 1
-        self.stats[self.today]["total_time"] += processing_time
-        if not success:
-            self.stats[self.today]["error_count"] += 1
-        total = self.stats[self.today]["processed_count"]
-        errors = self.stats[self.today]["error_count"]
-        self.stats[self.today]["success_rate"] = ((total - errors) / total) * 100 if total > 0 else 100
-        self.save_stats()
-
-    def get_today_stats(self):
-        return self.stats.get(self.today, {"processed_count": 0, "error_count": 0, "total_time": 0, "success_rate": 100.0, "total_invoice_balance": 0.0})
+# (label, PDFProcessor output_format); kept here so the window does not import pdf_processor.
+OUTPUT_CHOICES = [("One PDF per document", "files"), ("One ZIP of all documents", "zip"),
+                  ("One PDF with bookmarks", "pdf")]
+# Job list columns: (key, heading, width).
+JOB_COLUMNS = [("folder", "Input Folder", 330), ("status", "Status", 110), ("progress", "Progress", 80),
+               ("speed", "Throughput", 130)]
+# How often the job queue is polled while jobs are queued or running.
+POLL_INTERVAL_MS = 100
 
 class ModernInvoiceMergerGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Invoice & Affidavit Merger")
-        self.root.geometry("800x600")
+        self.root.geometry("800x760")
         self.stats_tracker = StatsTracker()
+        # PDFs are parsed in job processes; this process only draws the window.
+        self.job_queue = JobQueue(stats_file=STATS_FILE)
+        self._polling = False
+        # Finished jobs' (kind, message) still to be shown, and whether a message box is open.
+        self._messages = []
+        self._showing_message = False
         self.folder_path = tk.StringVar()   # Input folder
         self.output_folder = tk.StringVar()   # Output folder
         self.status_var = tk.StringVar(value="Ready to process files...")
         self.ignore_mismatch_var = tk.BooleanVar()
-        self.process_button = None
+        self.workers_var = tk.IntVar(value=min(os.cpu_count() or 1, 8))
+        self.fast_detection_var = tk.BooleanVar()
+        self.optimize_output_var = tk.BooleanVar()
+        self.incremental_var = tk.BooleanVar()
+        self.low_memory_var = tk.BooleanVar()
+        self.output_format_var = tk.StringVar(value=OUTPUT_CHOICES[0][0])
+        self.add_button = None
+        self.cancel_button = None
+        self.jobs_view = None
         self.progress = None
         self.setup_styles()
         self.setup_ui()
         self.setup_menu()
         self.update_stats_display()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def setup_styles(self):
         self.style = ttk.Style()
@@ -111,15 +91,37 @@ class ModernInvoiceMergerGUI:
         options_frame = ttk.Frame(content_frame)
         options_frame.pack(pady=10)
         ttk.Checkbutton(options_frame, text="Allow document count mismatch", variable=self.ignore_mismatch_var).pack()
+        ttk.Checkbutton(options_frame, text="Fast document-number detection", variable=self.fast_detection_var).pack()
+        ttk.Checkbutton(options_frame, text="Optimise output size", variable=self.optimize_output_var).pack()
+        ttk.Checkbutton(options_frame, text="Only rewrite changed documents", variable=self.incremental_var).pack()
+        ttk.Checkbutton(options_frame, text="Low memory (very large exports)", variable=self.low_memory_var).pack()
+        format_frame = ttk.Frame(options_frame)
+        format_frame.pack(pady=5)
+        ttk.Label(format_frame, text="Output:").pack(side=LEFT, padx=5)
+        ttk.Combobox(format_frame, textvariable=self.output_format_var, values=[label for label, _ in OUTPUT_CHOICES],
+                     state="readonly", width=28).pack(side=LEFT)
+        workers_frame = ttk.Frame(options_frame)
+        workers_frame.pack(pady=5)
+        ttk.Label(workers_frame, text="Worker processes:").pack(side=LEFT, padx=5)
+        ttk.Spinbox(workers_frame, from_=1, to=os.cpu_count() or 1, textvariable=self.workers_var, width=5).pack(side=LEFT)
 
         self.progress = ttk.Progressbar(content_frame, length=400, mode='determinate')
         self.progress.pack(pady=10)
         ttk.Label(content_frame, textvariable=self.status_var).pack()
 
+        self.jobs_view = ttk.Treeview(content_frame, columns=[key for key, _, _ in JOB_COLUMNS], show="headings",
+                                      height=4)
+        for key, heading, width in JOB_COLUMNS:
+            self.jobs_view.heading(key, text=heading)
+            self.jobs_view.column(key, width=width, stretch=key == "folder")
+        self.jobs_view.pack(pady=10, fill=X)
+
         button_frame = ttk.Frame(content_frame)
-        button_frame.pack(pady=20)
-        self.process_button = ttk.Button(button_frame, text="Process Files", command=self.process_files)
-        self.process_button.pack(side=LEFT, padx=5)
+        button_frame.pack(pady=10)
+        self.add_button = ttk.Button(button_frame, text="Add to Queue", command=self.add_job)
+        self.add_button.pack(side=LEFT, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel Job", command=self.cancel_job, state=DISABLED)
+        self.cancel_button.pack(side=LEFT, padx=5)
         ttk.Button(button_frame, text="Help", command=self.show_help).pack(side=LEFT, padx=5)
 
         self.total_balance_label = ttk.Label(content_frame, text="Total Invoice Balance: $0.00", style="StatsValue.TLabel")
@@ -128,7 +130,7 @@ class ModernInvoiceMergerGUI:
     def setup_menu(self):
         menu_bar = tk.Menu(self.root)
         file_menu = tk.Menu(menu_bar, tearoff=0)
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         menu_bar.add_cascade(label="File", menu=file_menu)
         help_menu = tk.Menu(menu_bar, tearoff=0)
         help_menu.add_command(label="About", command=self.show_about)
@@ -143,8 +145,13 @@ class ModernInvoiceMergerGUI:
             "1. Click 'Select Folder' to choose your input folder containing PDFs.\n"
             "2. Click 'Select Folder' for Output Folder to choose where merged files will be saved.\n"
             "3. PDFs must include 'invoice' and 'affidavit' in their names.\n"
-            "4. Click 'Process Files' to merge.\n"
-            "For mismatches, check 'Allow document count mismatch'."
+            "4. Click 'Add to Queue' to merge. Select and queue more folders while it runs; they are merged in turn.\n"
+            "'Cancel Job' stops the selected (or running) job and removes the files it wrote.\n"
+            "Raise 'Worker processes' to scan and write large PDFs on several CPU cores.\n"
+            "For mismatches, check 'Allow document count mismatch'.\n"
+            "Check 'Only rewrite changed documents' to re-run a month quickly or resume an interrupted run.\n"
+            "Check 'Low memory' for exports of hundreds of MB; it keeps memory use flat.\n"
+            "Choose a ZIP or a single bookmarked PDF under 'Output' to upload or share one file instead of hundreds."
         )
         messagebox.showinfo("Help", help_text)
 
@@ -175,77 +182,159 @@ class ModernInvoiceMergerGUI:
         if folder:
             self.output_folder.set(folder)
 
-    def process_files(self):
+    def add_job(self):
         if not self.folder_path.get():
             messagebox.showerror("Error", "Please select an input folder first!")
             return
-        # If no output folder is set, use a default subfolder in the input folder.
-        if not self.output_folder.get():
-            default_out = os.path.join(self.folder_path.get(), "output")
-            os.makedirs(default_out, exist_ok=True)
-            self.output_folder.set(default_out)
-        self.process_button.configure(state=DISABLED)
-        self.status_var.set("Processing... Please wait...")
-        self.progress['value'] = 0
-        self.queue = queue.Queue()
-        threading.Thread(target=self._process_thread, daemon=True).start()
-        self.root.after(100, self.check_queue)
-
-    def _process_thread(self):
-        start_time = time.time()
-        try:
-            # Pass output folder to PDFProcessor.
-            processor = PDFProcessor(
-                self.folder_path.get(),
-                output_dir=self.output_folder.get(),
-                ignore_mismatches=self.ignore_mismatch_var.get()
-            )
-            stats, mismatch_details = processor.process_pdfs()
-            message_parts = []
-            if mismatch_details:
-                message_parts.append("Warning: Document mismatches found:\n")
-                message_parts.extend(mismatch_details)
-                message_parts.append("\n")
-            message_parts.append(
-                f"Processing complete!\n\nFound {stats['invoice_count']} invoices and {stats['affidavit_count']} affidavits\n"
-                f"Successfully created {stats['processed_count']} merged files"
-            )
-            processing_time = time.time() - start_time
-            self.stats_tracker.update_processing_stats(True, processing_time)
-            self.stats_tracker.stats[self.stats_tracker.today]['total_invoice_balance'] = stats.get('total_invoice_balance', 0.0)
-            self.queue.put(("success", "\n".join(message_parts)))
-            logging.info("Processing thread completed successfully.")
-        except Exception as e:
-            processing_time = time.time() - start_time
-            self.stats_tracker.update_processing_stats(False, processing_time)
-            self.queue.put(("error", str(e)))
-            logging.error(f"Error in processing thread: {e}")
-        finally:
-            self.root.after(100, self.check_queue)
+        if self.incremental_var.get() and self._output_format() != "files":
+            messagebox.showerror("Error", "'Only rewrite changed documents' needs one file per document.")
+            return
+        input_dir = self.folder_path.get()
+        # Without an output folder, each job writes to a subfolder of its own input folder.
+        output_dir = self.output_folder.get() or os.path.join(input_dir, "output")
+        # The options are taken now, so changing them later does not affect queued jobs.
+        self.job_queue.add(input_dir, output_dir, {
+            'ignore_mismatches': self.ignore_mismatch_var.get(),
+            'workers': self.workers_var.get(),
+            'writer_workers': self.workers_var.get(),
+            'fast_detection': self.fast_detection_var.get(),
+            'optimize_output': self.optimize_output_var.get(),
+            'compress_content': self.optimize_output_var.get(),
+            'incremental': self.incremental_var.get(),
+            'low_memory': self.low_memory_var.get(),
+            'output_format': self._output_format(),
+        })
+        if not self._polling:
+            self._polling = True
+            self.check_queue()
+
+    def cancel_job(self):
+        job_ids = [int(iid) for iid in self.jobs_view.selection()]
+        if not job_ids and self.job_queue.running:
+            job_ids = [self.job_queue.running['id']]
+        for job_id in job_ids:
+            self.job_queue.cancel(job_id)
+        self.refresh_jobs()
+
+    def on_close(self):
+        if self.job_queue.busy():
+            if not messagebox.askyesno("Exit", "Cancel the queued and running jobs and exit?"):
+                return
+            self.status_var.set("Cancelling... removing partial output")
+            self.root.update()
+        self.job_queue.close()
+        self.root.destroy()
+
+    def _output_format(self):
+        return dict(OUTPUT_CHOICES)[self.output_format_var.get()]
+
+    def show_progress(self, event):
+        if event['fraction'] is not None:
+            self.progress['value'] = event['fraction'] * 100
+        if event['stage'] == "scanning":
+            status = f"Scanning: {event['pages_scanned']:,}/{event['pages_total']:,} pages"
+        elif event['stage'] == "merging":
+            status = f"Writing: {event['files_written']:,}/{event['documents_matched']:,} files"
+        else:
+            status = f"{event['files_written']:,} files written"
+        status += f" - {event['pages_per_sec']:,.0f} pages/sec"
+        if event['bytes_written']:
+            status += f", {event['bytes_written'] / 1_000_000:.1f} MB written"
+        if event['eta_seconds'] is not None:
+            minutes, seconds = divmod(int(event['eta_seconds']), 60)
+            status += f" - about {minutes}m {seconds:02d}s left" if minutes else f" - about {seconds}s left"
+        self.status_var.set(status)
+
+    def refresh_jobs(self):
+        for job in self.job_queue.jobs:
+            iid = str(job['id'])
+            values = self._job_row(job)
+            if self.jobs_view.exists(iid):
+                self.jobs_view.item(iid, values=values)
+            else:
+                self.jobs_view.insert("", END, iid=iid, values=values)
+        self.cancel_button.configure(state=NORMAL if self.job_queue.busy() else DISABLED)
+
+    def _job_row(self, job):
+        progress, result = job['progress'], job['result'] or {}
+        if job['status'] in ("ok", "mismatch") and result.get('processed_count') is not None:
+            percent = "100%"
+        elif progress and progress['fraction'] is not None:
+            percent = f"{progress['fraction'] * 100:.0f}%"
+        else:
+            percent = ""
+        if result.get('pages_per_sec'):
+            speed = f"{result['pages_per_sec']:,.0f} pages/sec"
+        elif progress and job['status'] in ("running", "cancelling"):
+            speed = f"{progress['pages_per_sec']:,.0f} pages/sec"
+        else:
+            speed = ""
+        return os.path.basename(job['input_dir']) or job['input_dir'], job['status'], percent, speed
+
+    def _job_message(self, job):
+        result = job['result']
+        folder = os.path.basename(job['input_dir']) or job['input_dir']
+        if job['status'] not in ("ok", "mismatch") or result.get('processed_count') is None:
+            # Failed, or refused to merge because of mismatches.
+            return "error", f"{folder}: {result.get('error', 'Processing failed')}"
+        message_parts = [f"{folder}:"]
+        if result.get('mismatches'):
+            message_parts.append("Warning: Document mismatches found:\n")
+            message_parts.extend(result['mismatches'])
+            message_parts.append("\n")
+        message_parts.append(
+            f"Processing complete!\n\nFound {result['invoice_count']} invoices and {result['affidavit_count']} affidavits\n"
+            f"Successfully created {result['processed_count']} merged files"
+        )
+        if result.get('skipped_count'):
+            message_parts.append(f"{result['skipped_count']} files were already up to date")
+        if result.get('output'):
+            message_parts.append(f"All documents were written to {os.path.basename(result['output'])}")
+        return "success", "\n".join(message_parts)
 
     def check_queue(self):
-        try:
-            msg_type, message = self.queue.get_nowait()
-            if msg_type == "success":
-                messagebox.showinfo("Success", message)
-                self.status_var.set("Ready for next batch...")
+        finished = self.job_queue.poll()
+        self.refresh_jobs()
+        running = self.job_queue.running
+        if running is not None:
+            if running['progress']:
+                self.show_progress(running['progress'])
+            if running['status'] == "cancelling":
+                self.status_var.set(f"Cancelling {os.path.basename(running['input_dir'])}... removing partial output")
+        for job in finished:
+            logging.info(f"Job {job['id']} ({job['input_dir']}) finished: {job['status']}")
+            if job['status'] == "cancelled":
+                self.status_var.set(f"Cancelled {os.path.basename(job['input_dir'])}; its partial output was removed.")
+                continue
+            kind, message = self._job_message(job)
+            if kind == "success":
                 total_balance = self.stats_tracker.get_today_stats().get('total_invoice_balance', 0.0)
                 self.total_balance_label["text"] = f"Total Invoice Balance: ${total_balance:.2f}"
+            self._messages.append((kind, message))
+        if self.job_queue.busy():
+            # Scheduled before any message box: an unattended queue keeps going while one is open.
+            self.root.after(POLL_INTERVAL_MS, self.check_queue)
+        else:
+            self._polling = False
+            if finished and finished[-1]['status'] != "cancelled":
                 self.progress['value'] = 100
-                self.process_button.configure(state=NORMAL)
-            elif msg_type == "error":
-                messagebox.showerror("Error", message)
-                self.status_var.set("Error occurred. Please try again.")
-                self.progress['value'] = 100
-                self.process_button.configure(state=NORMAL)
-        except queue.Empty:
-            current_value = self.progress['value']
-            if current_value < 100:
-                self.progress['value'] = min(current_value + 1, 100)
-                self.root.after(100, self.check_queue)
-            else:
-                self.status_var.set("Processing complete!")
-                self.process_button.configure(state=NORMAL)
+                self.status_var.set("Ready for next batch...")
+        self._show_messages()
+
+    def _show_messages(self):
+        # Tk keeps handling events while a message box is open, so polls run meanwhile; theirs wait their turn.
+        if self._showing_message:
+            return
+        self._showing_message = True
+        try:
+            while self._messages:
+                kind, message = self._messages.pop(0)
+                if kind == "success":
+                    messagebox.showinfo("Success", message)
+                else:
+                    messagebox.showerror("Error", message)
+        finally:
+            self._showing_message = False
 
 if __name__ == "__main__":
     root = ttk.Window(themename="flatly")
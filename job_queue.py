@@ -0,0 +1,181 @@
+# job_queue.py
+"""
+Job queue behind the GUI: input folders are merged one after another, each in its own process.
+
+A job process runs cli.run_job, so Tk never waits on PDF parsing, and sends its progress events
+and result back over a multiprocessing queue. Cancelling sets the job's event: the processor stops
+its scan and writer processes and removes what the job wrote (see PDFProcessor.cancel_event). A job
+process that has not stopped after CANCEL_GRACE_SECONDS is killed.
+"""
+import time
+import queue
+import logging
+import itertools
+import multiprocessing
+from typing import List, Optional
+
+# Seconds a cancelled job gets to stop its workers and clean up before its process is killed.
+CANCEL_GRACE_SECONDS = 15.0
+# Statuses of jobs that will not change any more.
+FINISHED = ("ok", "mismatch", "error", "cancelled")
+
+
+def _log_file() -> Optional[str]:
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler):
+            return handler.baseFilename
+    return None
+
+
+def _run_job(job_id: int, job: dict, options: dict, events, cancel_event, stats_file: Optional[str],
+             log_file: Optional[str]):
+    """Job process entry point."""
+    # A spawned process starts without the GUI's logging; its messages go to the same log file.
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.FileHandler(log_file) if log_file else logging.StreamHandler()])
+    from cli import run_job
+
+    # Called on the processor's worker threads; multiprocessing queues are safe to share between them.
+    options = dict(options, cancel_event=cancel_event,
+                   progress_callback=lambda event: events.put(("progress", job_id, event)))
+    events.put(("done", job_id, run_job(job, options, stats_file, "gui")))
+
+
+class JobQueue:
+    """
+    Input folders waiting to be merged, and the one being merged.
+
+    Each job is a dict with id, input_dir, output_dir, options (PDFProcessor keyword arguments),
+    status ("queued", "running", "cancelling" or one of FINISHED), progress (the latest progress
+    event) and result (what cli.run_job returned). poll() has to be called regularly, e.g. from
+    Tk's after(); it takes in progress, starts the next job and returns the jobs that finished.
+    """
+
+    def __init__(self, stats_file: Optional[str] = None):
+        self.stats_file = stats_file
+        self.jobs: List[dict] = []
+        # Spawned, as on Windows, so a job process never inherits Tk or the GUI's threads.
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._ids = itertools.count(1)
+        self._process = None
+        # Processes of jobs that have sent their result but not exited yet; joined by later polls.
+        self._exiting: List[multiprocessing.process.BaseProcess] = []
+        self._cancel_event = None
+        self._running: Optional[dict] = None
+        self._cancelled_at: Optional[float] = None
+
+    def add(self, input_dir: str, output_dir: Optional[str], options: dict) -> dict:
+        job = {'id': next(self._ids), 'input_dir': input_dir, 'output_dir': output_dir, 'options': dict(options),
+               'status': "queued", 'progress': None, 'result': None}
+        self.jobs.append(job)
+        return job
+
+    def get(self, job_id: int) -> Optional[dict]:
+        return next((job for job in self.jobs if job['id'] == job_id), None)
+
+    @property
+    def running(self) -> Optional[dict]:
+        return self._running
+
+    def busy(self) -> bool:
+        return any(job['status'] not in FINISHED for job in self.jobs)
+
+    def cancel(self, job_id: int):
+        job = self.get(job_id)
+        if job is None or job['status'] in FINISHED:
+            return
+        if job['status'] == "queued":
+            job['status'] = "cancelled"
+            return
+        if job['status'] == "running":
+            job['status'] = "cancelling"
+            self._cancel_event.set()
+            self._cancelled_at = time.monotonic()
+
+    def poll(self) -> List[dict]:
+        finished = []
+        self._drain(finished)
+        if self._process is not None and self._running is None:
+            # The job sent its result and its process is exiting; the next job need not wait for that.
+            self._exiting.append(self._process)
+            self._process = None
+        elif self._process is not None and not self._process.is_alive():
+            # Whatever it sent before exiting is in the pipe by now.
+            self._drain(finished)
+            if self._running is not None:
+                cancelled = self._running['status'] == "cancelling"
+                self._finish(self._running, {
+                    'status': "cancelled" if cancelled else "error",
+                    'error': "Processing cancelled" if cancelled else
+                    f"The job process stopped unexpectedly (exit code {self._process.exitcode})",
+                }, finished)
+            self._process.join()
+            self._process = None
+        elif self._process is not None and self._cancelled_at is not None:
+            if time.monotonic() - self._cancelled_at > CANCEL_GRACE_SECONDS:
+                logging.warning(f"Job {self._running['id']} did not stop after {CANCEL_GRACE_SECONDS:.0f}s; "
+                                "ending its process.")
+                self._process.terminate()
+                self._cancelled_at = None
+        for process in [process for process in self._exiting if not process.is_alive()]:
+            process.join()
+            self._exiting.remove(process)
+        if self._process is None:
+            self._start_next()
+        return finished
+
+    def _drain(self, finished: List[dict]):
+        while True:
+            try:
+                kind, job_id, payload = self._events.get_nowait()
+            except queue.Empty:
+                return
+            job = self.get(job_id)
+            if kind == "progress":
+                job['progress'] = payload
+            elif job is self._running:
+                self._finish(job, payload, finished)
+
+    def _finish(self, job: dict, result: dict, finished: List[dict]):
+        job['result'] = result
+        job['status'] = result['status']
+        finished.append(job)
+        self._running = None
+        self._cancelled_at = None
+
+    def _start_next(self):
+        job = next((job for job in self.jobs if job['status'] == "queued"), None)
+        if job is None:
+            return
+        job['status'] = "running"
+        self._running = job
+        self._cancel_event = self._context.Event()
+        spec = {'input_dir': job['input_dir'], 'input_files': None, 'output_dir': job['output_dir']}
+        # Not a daemon: daemonic processes may not start the scan and writer pools.
+        self._process = self._context.Process(
+            target=_run_job, daemon=False,
+            args=(job['id'], spec, job['options'], self._events, self._cancel_event, self.stats_file, _log_file()),
+        )
+        self._process.start()
+
+    def close(self, timeout: float = CANCEL_GRACE_SECONDS):
+        """Cancel everything and wait for the running job to clean up; used when the window closes."""
+        for job in self.jobs:
+            self.cancel(job['id'])
+        if self._process is not None:
+            deadline = time.monotonic() + timeout
+            while self._process.is_alive() and time.monotonic() < deadline:
+                # A child cannot exit while what it sent is stuck in a full pipe.
+                self._drain([])
+                self._process.join(0.1)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        for process in self._exiting:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._exiting = []
@@ -1,13 +1,33 @@
-from gui import ModernInvoiceMergerGUI
-from ttkthemes import ThemedTk
-import tkinter as tk
+import time
+# Taken before anything else is imported, so the startup probe measures the whole start-up.
+_STARTED = time.perf_counter()
+
+import os
+import sys
+import multiprocessing
 from utils.logger import setup_logging
 
+# When set, the app draws its first frame, writes "<seconds> <PyPDF2 loaded>" to this file and exits.
+STARTUP_PROBE_ENV = "INVOICE_MERGER_STARTUP_PROBE"
+
 def main():
+    # Required for the extraction worker processes in the frozen Windows build. Everything heavy is
+    # imported after this, so worker processes never load Tk or the GUI.
+    multiprocessing.freeze_support()
     setup_logging()
-    root = ThemedTk(theme="arc")
+    import tkinter as tk
+    from gui import ModernInvoiceMergerGUI
+    # The GUI styles itself with ttkbootstrap, which replaces any theme set on the root.
+    root = tk.Tk()
     app = ModernInvoiceMergerGUI(root)
+    probe = os.environ.get(STARTUP_PROBE_ENV)
+    if probe:
+        root.update()
+        with open(probe, 'w') as f:
+            f.write(f"{time.perf_counter() - _STARTED:.4f} {int('PyPDF2' in sys.modules)}\n")
+        root.destroy()
+        return
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
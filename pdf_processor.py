@@ -1,101 +1,806 @@
 # pdf_processor.py
+import io
 import os
-from PyPDF2 import PdfReader
 from PyPDF2._writer import PdfWriter  # force direct import
-import re
+import queue
+import sqlite3
 import logging
-from tqdm import tqdm
-from typing import Dict, List, Tuple
+import time
+import tempfile
+import threading
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from utils.validator import FileValidator
+from utils.content_stream import extract_header_text, has_simple_fonts
+from utils.pdf_cache import PdfHandle, close_pdf, log_parse_summary, open_pdf
+from utils.page_index import DEFAULT_MAX_PAGES, PageIndex, file_fingerprint, page_fingerprint
+from utils.pdf_optimizer import compress_page_contents, deduplicate_streams
+from utils.output_manifest import OutputManifest, page_content_hash, source_key
+from utils.output_archive import OUTPUT_FORMATS, CombinedPdfOutput, archive_filename, open_output
+from utils.matching import build_match_report, month_code, split_input_files, suggestion_lines, write_match_report
+from utils.progress import ProgressReporter
+from utils.run_report import RunReport
+from utils.extraction_rules import DEFAULT_RULES, UNKNOWN_CUSTOMER, ExtractionRules
+
+# Used when no rules are passed in; PDFProcessor loads its own, from extraction_rules.json if present.
+_DEFAULT_RULES = ExtractionRules(DEFAULT_RULES)
+# Below this many pages per worker the process start-up cost outweighs the gain.
+MIN_PAGES_PER_WORKER = 25
+# Documents queued per writer process; bounds how much work (and memory) is in flight at once.
+PENDING_WRITES_PER_WORKER = 2
+# Writer processes are replaced after this many documents so their memory cannot creep up on long runs.
+WRITES_PER_WORKER_PROCESS = 200
+# Seconds between checks of the cancel event while waiting for a scanner.
+CANCEL_POLL_INTERVAL = 0.1
+
+
+class ProcessingCancelled(Exception):
+    """Raised by process_pdfs when its cancel_event is set; the run's partial output has been removed."""
+
+
+def _stop_workers(executor: ProcessPoolExecutor):
+    """Drop queued tasks and end the worker processes, including any in the middle of a task."""
+    # ProcessPoolExecutor cannot interrupt a running task, and only keeps its processes privately;
+    # shutdown() forgets them, so they are taken first.
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def extract_customer_info(text: str, rules: Optional[ExtractionRules] = None) -> str:
+    return (rules or _DEFAULT_RULES).customer(text)
+
+
+def detect_document_number(page, fast_detection: bool = False, max_text_ops: int = 60,
+                           header_region: Optional[float] = None,
+                           rules: Optional[ExtractionRules] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return (document number or None, customer or None if the fast path decided).
+
+    The fast path only decodes the start of the content stream. It falls back to extract_text()
+    when the page uses fonts whose bytes need a CMap, or when it decodes no text at all. The
+    full text is scanned once for both fields.
+    """
+    rules = rules or _DEFAULT_RULES
+    if fast_detection and has_simple_fonts(page):
+        header_text = extract_header_text(page, max_text_ops, header_region)
+        if header_text.strip():
+            return rules.extract(header_text).document_number, None
+    fields = rules.extract(page.extract_text())
+    return fields.document_number, UNKNOWN_CUSTOMER if fields.customer is None else fields.customer
+
+
+def _scan_pages(pdf_path: str, indices: List[int], fast_detection: bool = False,
+                max_text_ops: int = 60, header_region: Optional[float] = None, low_memory: bool = False,
+                rules: Optional[ExtractionRules] = None) -> Tuple[List[Tuple[int, str]], List[Tuple[int, float]]]:
+    """
+    Worker entry point: return (page index, document number) for the header pages among indices,
+    and (page index, seconds) for every page scanned.
+    """
+    # Cached per worker process, so later chunks of the same file skip the parse. Memory-mapped so
+    # all workers share one copy of the file in the OS page cache.
+    handle = open_pdf(pdf_path, use_mmap=True, low_memory=low_memory)
+    matches = []
+    timings = []
+    for index in indices:
+        page_start = time.perf_counter()
+        doc_num, _ = detect_document_number(handle.page(index), fast_detection, max_text_ops, header_region, rules)
+        timings.append((index, time.perf_counter() - page_start))
+        if low_memory:
+            handle.reader.resolved_objects.clear()
+        if doc_num:
+            matches.append((index, doc_num))
+    return matches, timings
+
+
+def _assemble_document(writer: PdfWriter, invoice: PdfHandle, invoice_indices: List[int], affidavit: PdfHandle,
+                       affidavit_indices: List[int], customer_info: Optional[str],
+                       rules: Optional[ExtractionRules] = None) -> Tuple[int, Optional[str]]:
+    """Append one document's pages to writer; the caller holds both handles' locks. Returns (pages added, customer)."""
+    for index in invoice_indices:
+        writer.add_page(invoice.page(index))
+    for index in affidavit_indices:
+        writer.add_page(affidavit.page(index))
+    if invoice_indices and customer_info is None:
+        customer_info = extract_customer_info(invoice.page(invoice_indices[0]).extract_text(), rules)
+    return len(invoice_indices) + len(affidavit_indices), customer_info
+
+
+def _document_filename(doc_num: str, customer_info: str) -> str:
+    return f"{doc_num} {FileValidator.sanitize_filename(customer_info)}.pdf"
+
+
+def _optimize(writer: PdfWriter, optimize_output: bool, compress_content: bool) -> int:
+    saved = 0
+    if optimize_output:
+        _, saved = deduplicate_streams(writer)
+    if compress_content:
+        compress_page_contents(writer)
+    return saved
+
+
+def _write_document(doc_num: str, invoice_path: str, invoice_indices: List[int], affidavit_path: str,
+                    affidavit_indices: List[int], output_dir: Optional[str], customer_info: Optional[str] = None,
+                    optimize_output: bool = False, compress_content: bool = False,
+                    low_memory: bool = False, rules: Optional[ExtractionRules] = None
+                    ) -> Tuple[Optional[str], Optional[str], int, int, float, Optional[bytes]]:
+    """
+    Writer entry point: merge one document's page ranges into "<doc_num> <customer>.pdf".
+
+    The file is written under a temporary name and renamed into place, so an output is either
+    complete or absent. With output_dir None nothing is written; the merged file's bytes are
+    returned instead, for an archive. With optimize_output, identical resource streams are stored
+    once; with compress_content, uncompressed page content streams are flate-encoded.
+    Returns (output filename or None if there were no pages, customer, bytes written,
+    bytes saved by optimisation, seconds spent assembling, optimising and writing, file bytes).
+    """
+    start = time.perf_counter()
+    invoice = open_pdf(invoice_path, use_mmap=True, low_memory=low_memory)
+    affidavit = open_pdf(affidavit_path, use_mmap=True, low_memory=low_memory)
+    writer = PdfWriter()
+    # Scanner threads may share these handles in the main process; always lock in this order.
+    with invoice.lock, affidavit.lock:
+        pages, customer_info = _assemble_document(writer, invoice, invoice_indices, affidavit, affidavit_indices,
+                                                  customer_info, rules)
+        if not pages:
+            return None, customer_info, 0, 0, 0.0, None
+        filename = _document_filename(doc_num, customer_info)
+        try:
+            saved = _optimize(writer, optimize_output, compress_content)
+            if output_dir is None:
+                buffer = io.BytesIO()
+                writer.write(buffer)
+                return filename, customer_info, buffer.tell(), saved, time.perf_counter() - start, buffer.getvalue()
+            output_filename = os.path.join(output_dir, filename)
+            fd, temp_path = tempfile.mkstemp(prefix=f".{doc_num}.", suffix=".part", dir=output_dir)
+            try:
+                with os.fdopen(fd, 'wb') as output_file:
+                    writer.write(output_file)
+                    size = output_file.tell()
+                os.replace(temp_path, output_filename)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        finally:
+            # Objects resolved for this document are not needed again; keeping them would grow
+            # the reader's cache to the whole file over a long run.
+            invoice.reader.resolved_objects.clear()
+            affidavit.reader.resolved_objects.clear()
+    return output_filename, customer_info, size, saved, time.perf_counter() - start, None
+
+
+def _append_document(output: CombinedPdfOutput, doc_num: str, invoice: PdfHandle, invoice_indices: List[int],
+                     affidavit: PdfHandle, affidavit_indices: List[int],
+                     customer_info: Optional[str],
+                     rules: Optional[ExtractionRules] = None) -> Tuple[Optional[str], Optional[str], int, int, float]:
+    """Add one document to a combined PDF, bookmarked "<doc_num> <customer>"; returns what _write_document does."""
+    start = time.perf_counter()
+    with invoice.lock, affidavit.lock:
+        first_page = len(output.writer.pages)
+        try:
+            pages, customer_info = _assemble_document(output.writer, invoice, invoice_indices, affidavit,
+                                                      affidavit_indices, customer_info, rules)
+        finally:
+            invoice.reader.resolved_objects.clear()
+            affidavit.reader.resolved_objects.clear()
+    if not pages:
+        return None, customer_info, 0, 0, 0.0
+    output.add_bookmark(f"{doc_num} {customer_info}", first_page)
+    # The file is written when the output is closed; its size is counted then.
+    return _document_filename(doc_num, customer_info), customer_info, 0, 0, time.perf_counter() - start
+
+
+class _DocumentWriter:
+    """
+    Writer stage of process_pdfs. With one writer it merges in the calling thread; otherwise it
+    hands page index ranges to a process pool and keeps at most PENDING_WRITES_PER_WORKER
+    documents per process in flight, so memory does not grow with the number of documents.
+
+    With an output (see utils/output_archive.py) every document goes into that single file
+    instead: writer processes return their merged bytes for a ZIP, and a combined PDF is
+    assembled in the calling thread, since its pages all have to end up in one PdfWriter.
+    """
+
+    def __init__(self, processor: "PDFProcessor", output_dir: str, workers: int, output=None):
+        self.processor = processor
+        self.output_dir = output_dir
+        self.output = output
+        self.executor = None
+        if workers > 1 and not isinstance(output, CombinedPdfOutput):
+            self.executor = ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=WRITES_PER_WORKER_PROCESS)
+        self.max_pending = workers * PENDING_WRITES_PER_WORKER
+        self.pending: Dict[str, Future] = {}
+
+    def submit(self, doc_num: str, invoice_path: str, invoice_indices: List[int], affidavit_path: str,
+               affidavit_indices: List[int], customer_info: Optional[str]):
+        if isinstance(self.output, CombinedPdfOutput):
+            try:
+                invoice, affidavit = (open_pdf(path, low_memory=self.processor.low_memory)
+                                      for path in (invoice_path, affidavit_path))
+                self.processor._document_written(doc_num, *_append_document(
+                    self.output, doc_num, invoice, invoice_indices, affidavit, affidavit_indices, customer_info,
+                    self.processor.rules))
+            except Exception as e:
+                logging.error(f"Error processing document {doc_num}: {e}")
+            return
+        args = (doc_num, invoice_path, invoice_indices, affidavit_path, affidavit_indices,
+                None if self.output else self.output_dir, customer_info,
+                self.processor.optimize_output, self.processor.compress_content, self.processor.low_memory,
+                self.processor.rules)
+        if self.executor is None:
+            try:
+                self._written(doc_num, _write_document(*args))
+            except Exception as e:
+                logging.error(f"Error processing document {doc_num}: {e}")
+            return
+        # A repeated document number must not race its earlier write for the same filename.
+        self.wait_for(doc_num)
+        while len(self.pending) >= self.max_pending:
+            self._collect(FIRST_COMPLETED)
+        self.pending[doc_num] = self.executor.submit(_write_document, *args)
+
+    def wait_for(self, doc_num: str):
+        """Finish the outstanding write of doc_num, if there is one."""
+        future = self.pending.pop(doc_num, None)
+        if future is not None:
+            self._finish(doc_num, future)
+
+    def _written(self, doc_num: str, result: tuple):
+        *result, data = result
+        if data is not None:
+            self.output.add(result[0], data)
+        self.processor._document_written(doc_num, *result)
+
+    def _collect(self, return_when):
+        done, _ = wait(list(self.pending.values()), return_when=return_when)
+        for doc_num, future in list(self.pending.items()):
+            if future in done:
+                self._finish(doc_num, self.pending.pop(doc_num))
+
+    def _finish(self, doc_num: str, future: Future):
+        try:
+            self._written(doc_num, future.result())
+        except Exception as e:
+            logging.error(f"Error processing document {doc_num}: {e}")
+
+    def close(self, cancel: bool = False):
+        """Wait for outstanding writes (or stop them), then finish the single output file or discard it."""
+        try:
+            if self.executor is not None:
+                if cancel:
+                    _stop_workers(self.executor)
+                    return
+                if self.pending:
+                    self._collect(ALL_COMPLETED)
+                self.executor.shutdown()
+        except BaseException:
+            cancel = True
+            raise
+        finally:
+            if self.output is not None:
+                self.output.close(keep=not cancel)
+
 
 class PDFProcessor:
-    def __init__(self, input_dir: str = None, output_dir=None, ignore_mismatches: bool = False):
+    def __init__(self, input_dir: str = None, output_dir=None, ignore_mismatches: bool = False,
+                 workers: int = 1, fast_detection: bool = False, max_text_ops: int = 60,
+                 header_region: Optional[float] = None, use_page_index: bool = True,
+                 page_index_max_pages: int = DEFAULT_MAX_PAGES, writer_workers: int = 1,
+                 optimize_output: bool = False, compress_content: bool = False,
+                 input_files: Optional[Sequence[str]] = None, profile: Optional[str] = None,
+                 write_report: bool = True, progress_callback: Optional[Callable[[dict], None]] = None,
+                 incremental: bool = False, low_memory: bool = False, output_format: str = "files",
+                 rules_file: Optional[str] = None, cancel_event=None):
         self.input_dir = input_dir or 'input'
         self.output_dir = output_dir
         self.ignore_mismatches = ignore_mismatches
-        self.found_files = self._find_input_files()
+        self.workers = max(1, int(workers or 1))
+        self.writer_workers = max(1, int(writer_workers or 1))
+        self.optimize_output = optimize_output
+        self.compress_content = compress_content
+        self.fast_detection = fast_detection
+        self.max_text_ops = max_text_ops
+        self.header_region = header_region
+        # For inputs of hundreds of MB: read them through mmap instead of into memory, drop each
+        # page's objects once it has been scanned, and release the files when the run ends.
+        self.low_memory = low_memory
+        # Anything with is_set(), such as a multiprocessing.Event; once set, process_pdfs stops its
+        # workers, removes what the run wrote and raises ProcessingCancelled.
+        self.cancel_event = cancel_event
+        # Document-number formats and customer anchors; see utils/extraction_rules.py.
+        self.rules = ExtractionRules.load(rules_file)
+        # Customer names of header pages, keyed by (pdf path, page index), found by the same pass over
+        # the text as the document number, so the first invoice page is not extracted a second time.
+        self._customer_cache: Dict[Tuple[str, int], str] = {}
+        self.use_page_index = use_page_index
+        self.page_index_max_pages = page_index_max_pages
+        # Open only while process_pdfs runs; the index lives in the output directory.
+        self._page_index: Optional[PageIndex] = None
+        self._page_hashes: Dict[str, List[str]] = {}
+        self._indexed_customers: Dict[str, str] = {}
+        # With incremental, documents whose source pages and options match the output manifest
+        # are not written again, and an interrupted run resumes where it stopped.
+        self.incremental = incremental
+        # "zip" or "pdf" write every document into one file in the output directory (see
+        # utils/output_archive.py); output_path is that file once process_pdfs has finished.
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}; expected one of {', '.join(OUTPUT_FORMATS)}")
+        if incremental and output_format != "files":
+            raise ValueError("Incremental runs need one file per document (output format 'files')")
+        self.output_format = output_format
+        self.output_path: Optional[str] = None
+        self._manifest: Optional[OutputManifest] = None
+        self._source_keys: Dict[str, str] = {}
+        # Timings for the run; process_pdfs saves them as run_report.json in the output directory.
+        self.report = RunReport(profile)
+        self.write_report = write_report
+        self.report_path: Optional[str] = None
+        self.match_report_path: Optional[str] = None
+        # Rate-limited progress events (see utils/progress.py) for a GUI or other front end.
+        self.progress = ProgressReporter(progress_callback)
+        # Explicit input files (every part of an export, sorted out by name like a folder's files)
+        # skip discovery in input_dir. found_files lists the invoice files, then the affidavit files;
+        # input_parts has them by side.
+        self.input_parts: Dict[str, List[str]] = {}
+        with self.report.stage("validation"):
+            if input_files:
+                self.found_files = self._validate_input_files(*split_input_files(input_files))
+            else:
+                self.found_files = self._find_input_files()
         self.stats = {
             'invoice_count': 0,
             'affidavit_count': 0,
-            'processed_count': 0
+            'processed_count': 0,
+            'bytes_written': 0,
+            'bytes_saved': 0,
+            'skipped_count': 0
         }
 
-    def _find_input_files(self) -> Tuple[str, str]:
+    def _find_input_files(self) -> Tuple[str, ...]:
         if not os.path.exists(self.input_dir):
             os.makedirs(self.input_dir)
             raise FileNotFoundError(f"Created input directory at {self.input_dir}. Please place your PDF files there.")
 
-        files = os.listdir(self.input_dir)
-        invoice_file = next((f for f in files if 'invoice' in f.lower()), None)
-        affidavit_file = next((f for f in files if 'affidavit' in f.lower()), None)
+        with os.scandir(self.input_dir) as entries:
+            files = sorted(entry.name for entry in entries if entry.is_file() and entry.name.lower().endswith('.pdf'))
+        invoice_files, affidavit_files = split_input_files([os.path.join(self.input_dir, f) for f in files])
 
-        if not (invoice_file and affidavit_file):
+        if not (invoice_files and affidavit_files):
             raise FileNotFoundError(
                 "Please ensure both invoice and affidavit PDFs are in the input directory.\n"
                 "Files should have 'invoice' and 'affidavit' in their names."
             )
 
-        file_paths = [os.path.join(self.input_dir, invoice_file), os.path.join(self.input_dir, affidavit_file)]
+        return self._validate_input_files(invoice_files, affidavit_files)
+
+    def _validate_input_files(self, invoice_files: List[str], affidavit_files: List[str]) -> Tuple[str, ...]:
+        file_paths = invoice_files + affidavit_files
         validation_errors = FileValidator.validate_pdfs(file_paths)
         if validation_errors:
             raise ValueError("\n".join(validation_errors))
 
         for file_path in file_paths:
-            structure_error = FileValidator.validate_pdf_structure(file_path)
+            structure_error = FileValidator.validate_pdf_structure(file_path, low_memory=self.low_memory)
             if structure_error:
                 raise ValueError(structure_error)
 
-        return (os.path.join(self.input_dir, invoice_file), os.path.join(self.input_dir, affidavit_file))
+        self.input_parts = {'invoice': invoice_files, 'affidavit': affidavit_files}
+        if len(file_paths) > 2:
+            logging.info(f"Found {len(invoice_files)} invoice and {len(affidavit_files)} affidavit files")
+        return tuple(file_paths)
 
     def extract_customer_info_from_invoice(self, text: str) -> str:
-        lines = text.splitlines()
-        bill_to_index = -1
-        for i, line in enumerate(lines):
-            if "Bill To" in line:
-                bill_to_index = i
-                break
-        if bill_to_index != -1 and bill_to_index + 1 < len(lines):
-            customer_name = lines[bill_to_index + 1].strip()
-            return customer_name
-        return "UNKNOWN"
+        return extract_customer_info(text, self.rules)
 
     def extract_info_from_pdf(self, pdf_path: str, debug_doc_num: str = None) -> Dict[str, List]:
-        reader = PdfReader(pdf_path)
+        handle = open_pdf(pdf_path, low_memory=self.low_memory)
         documents = {}
-        current_doc = None
-        current_pages = []
         doc_numbers = []
-        for page in tqdm(reader.pages, desc=f"Processing {os.path.basename(pdf_path)}", unit="page"):
-            text = page.extract_text()
-            doc_match = re.search(r'(?:Invoice #|Affidavit)\s*(\d{4}-\d{3})', text)
-            if doc_match:
-                if current_doc:
-                    documents[current_doc] = current_pages
-                current_doc = doc_match.group(1)
-                current_pages = [page]
-                doc_numbers.append(current_doc)
-            elif current_doc:
-                current_pages.append(page)
-        if current_doc:
-            documents[current_doc] = current_pages
+        for doc_num, page_indices in self._iter_document_runs(handle):
+            documents[doc_num] = [handle.page(i) for i in page_indices]
+            doc_numbers.append(doc_num)
         logging.info(f"Found documents in {os.path.basename(pdf_path)}: {sorted(doc_numbers)}")
         return documents
 
+    def _iter_document_runs(self, handle: PdfHandle,
+                            executor: ProcessPoolExecutor = None) -> Iterator[Tuple[str, List[int]]]:
+        """Yield (document number, page indices) as soon as the next header page closes the run."""
+        current_doc = None
+        current_start = 0
+        for index, doc_num in self._iter_header_pages(handle, executor):
+            if current_doc:
+                yield current_doc, list(range(current_start, index))
+            current_doc, current_start = doc_num, index
+        if current_doc:
+            yield current_doc, list(range(current_start, handle.page_count))
+
+    def _iter_header_pages(self, handle: PdfHandle,
+                           executor: ProcessPoolExecutor = None) -> Iterator[Tuple[int, str]]:
+        if self._page_index is None:
+            yield from self._detect_header_pages(handle, executor)
+            return
+        name = os.path.basename(handle.path)
+        with self.report.stage("fingerprint"):
+            file_hash = file_fingerprint(handle.path)
+            self.report.add_bytes_read(handle.size)
+            page_hashes = self._page_index.file_pages(file_hash)
+            if page_hashes is None:
+                with handle.lock:
+                    page_hashes = []
+                    for index in range(handle.page_count):
+                        page_hashes.append(page_fingerprint(handle.page(index)))
+                        if self.low_memory:
+                            handle.reader.resolved_objects.clear()
+        self._page_hashes[handle.path] = page_hashes
+        known = self._page_index.lookup(page_hashes)
+        self._indexed_customers.update(
+            (page_hash, customer) for page_hash, (_, customer) in known.items() if customer is not None
+        )
+
+        results = {}
+        if len(known) == len(set(page_hashes)):
+            logging.info(f"Page index: all {len(page_hashes)} pages of {name} are known; skipping extraction.")
+            self.report.pages_from_index += len(page_hashes)
+            self.progress.pages(len(page_hashes))
+            for index, page_hash in enumerate(page_hashes):
+                if known[page_hash][0]:
+                    yield index, known[page_hash][0]
+            return
+        if known:
+            logging.info(f"Page index: re-extracting {len(set(page_hashes)) - len(known)} changed pages of {name}.")
+            unknown = [index for index, page_hash in enumerate(page_hashes) if page_hash not in known]
+            # Fast detection finding nothing only means it cannot read this file if the index knows no header either.
+            fallback = not any(doc_num for doc_num, _ in known.values())
+            # Scanned like a whole file (in the pool when there are enough pages); matches come in page order.
+            scanned = self._detect_header_pages(handle, executor, unknown, fallback)
+            match = next(scanned, None)
+            for index, page_hash in enumerate(page_hashes):
+                if page_hash in known:
+                    doc_num = known[page_hash][0]
+                    self.report.pages_from_index += 1
+                    self.progress.pages()
+                elif match is not None and match[0] == index:
+                    doc_num = match[1]
+                    match = next(scanned, None)
+                else:
+                    doc_num = None
+                results[page_hash] = doc_num
+                if doc_num:
+                    yield index, doc_num
+        else:
+            results = dict.fromkeys(page_hashes)
+            for index, doc_num in self._detect_header_pages(handle, executor):
+                results[page_hashes[index]] = doc_num
+                yield index, doc_num
+        # Only reached when the caller consumed the whole scan, so a partial scan is never stored.
+        self._page_index.store_file(file_hash, page_hashes, results)
+
+    def _detect_header_pages(self, handle: PdfHandle, executor: ProcessPoolExecutor = None,
+                             indices: Optional[List[int]] = None, fallback: bool = True) -> Iterator[Tuple[int, str]]:
+        """Header pages among indices (default: every page), in page order."""
+        indices = list(range(handle.page_count)) if indices is None else indices
+        found = 0
+        for match in self._scan_header_pages(handle, executor, self.fast_detection, indices):
+            found += 1
+            yield match
+        if self.fast_detection and fallback and not found and indices:
+            logging.warning(f"Fast detection found no documents in {os.path.basename(handle.path)}; "
+                            "rescanning with full text extraction.")
+            yield from self._scan_header_pages(handle, executor, False, indices)
+
+    def _scan_header_pages(self, handle: PdfHandle, executor: ProcessPoolExecutor, fast_detection: bool,
+                           indices: List[int]) -> Iterator[Tuple[int, str]]:
+        workers = min(self.workers, len(indices) // MIN_PAGES_PER_WORKER)
+        # With several parts, one too small to split still goes to the pool, to be scanned beside the others.
+        several_parts = len(self.found_files) > 2
+        if workers > 1 or (executor is not None and several_parts and indices):
+            yield from self._scan_pages_parallel(handle.path, indices, max(workers, 1), executor, fast_detection)
+            return
+        for index in indices:
+            doc_num, customer = self._detect_page(handle, index, fast_detection)
+            self.progress.pages()
+            if doc_num:
+                if customer is not None:
+                    self._customer_cache[(handle.path, index)] = customer
+                yield index, doc_num
+
+    def _detect_page(self, handle: PdfHandle, index: int, fast_detection: bool) -> Tuple[Optional[str], Optional[str]]:
+        with handle.lock:
+            start = time.perf_counter()
+            result = detect_document_number(handle.page(index), fast_detection,
+                                            self.max_text_ops, self.header_region, self.rules)
+            self.report.add_page_times(handle.path, [(index, time.perf_counter() - start)])
+            if self.low_memory:
+                # Drop the page's content, fonts and images again; the merge re-reads what it needs.
+                handle.reader.resolved_objects.clear()
+        return result
+
+    def _page_customer(self, handle: PdfHandle, index: int) -> str:
+        customer = self._customer_cache.get((handle.path, index))
+        if customer is None:
+            with handle.lock:
+                customer = self.extract_customer_info_from_invoice(handle.page(index).extract_text())
+            self._customer_cache[(handle.path, index)] = customer
+        return customer
+
+    def _scan_pages_parallel(self, pdf_path: str, indices: List[int], workers: int,
+                             executor: ProcessPoolExecutor = None,
+                             fast_detection: bool = False) -> Iterator[Tuple[int, str]]:
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as own_executor:
+                yield from self._scan_pages_parallel(pdf_path, indices, workers, own_executor, fast_detection)
+            return
+        # Two chunks per worker keeps the pool busy when some pages are slower to decode.
+        chunk_size = -(-len(indices) // (workers * 2))
+        chunks = [indices[start:start + chunk_size] for start in range(0, len(indices), chunk_size)]
+        logging.info(f"Scanning {os.path.basename(pdf_path)} with {workers} workers in {len(chunks)} chunks")
+        futures = [
+            executor.submit(_scan_pages, pdf_path, chunk, fast_detection, self.max_text_ops,
+                            self.header_region, self.low_memory, self.rules)
+            for chunk in chunks
+        ]
+        # Consume in submission order so matches stay in page order.
+        for chunk, future in zip(chunks, futures):
+            matches, timings = future.result()
+            self.report.add_page_times(pdf_path, timings)
+            self.progress.pages(len(chunk))
+            yield from matches
+
+    def _scan_to_queue(self, side: str, pdf_path: str, executor: ProcessPoolExecutor,
+                       events: queue.Queue, stop_event: threading.Event):
+        """Scanner thread body: push each completed document run onto the merge queue."""
+        try:
+            with self.report.profiled():
+                for doc_num, page_indices in self._iter_document_runs(open_pdf(pdf_path, low_memory=self.low_memory), executor):
+                    if stop_event.is_set():
+                        return
+                    events.put(("run", side, pdf_path, doc_num, page_indices))
+            events.put(("done", side, pdf_path))
+        except Exception as e:
+            events.put(("error", side, e))
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ProcessingCancelled("Processing cancelled")
+
+    def _next_event(self, events: queue.Queue) -> tuple:
+        if self.cancel_event is None:
+            return events.get()
+        while True:
+            self._check_cancelled()
+            try:
+                return events.get(timeout=CANCEL_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def _discard_outputs(self, output_dir: str):
+        """
+        Remove what a cancelled run wrote: temporary files of stopped writers and, unless the run is
+        incremental, the documents it finished. An incremental run keeps them for the next run to resume.
+        """
+        for entry in os.scandir(output_dir):
+            # Temporary files are only ever ours, and never valid output; left-overs of earlier runs go too.
+            if entry.name.startswith('.') and entry.name.endswith('.part'):
+                os.remove(entry.path)
+            # Matched by name and age rather than by the results collected so far: a writer process
+            # can finish a document after the run stopped listening for it.
+            elif (not self.incremental and self.output_format == "files" and entry.name.endswith('.pdf')
+                  and entry.name.split(' ', 1)[0] in self._submitted and entry.stat().st_mtime >= self.report.started):
+                os.remove(entry.path)
+        logging.info(f"Cancelled; removed the partial output in {output_dir}.")
+
+    def _known_customer(self, handle: PdfHandle, index: int) -> Optional[str]:
+        """Customer for a header page if the index or the customer cache has it; None leaves it to the writer."""
+        page_hashes = self._page_hashes.get(handle.path)
+        if page_hashes and page_hashes[index] in self._indexed_customers:
+            return self._indexed_customers[page_hashes[index]]
+        return self._customer_cache.get((handle.path, index))
+
+    def _document_written(self, doc_num: str, output_filename: Optional[str], customer_info: Optional[str],
+                          size: int, saved: int, elapsed: float):
+        if output_filename is None:
+            logging.warning(f"No valid pages for document {doc_num}; skipping file creation.")
+            return
+        if self.optimize_output:
+            logging.info(f"Processed document {doc_num}: {output_filename} ({size} bytes, "
+                         f"{saved} bytes of duplicate resources removed, written in {elapsed:.3f}s)")
+        else:
+            logging.info(f"Processed document {doc_num}: {output_filename} ({size} bytes in {elapsed:.3f}s)")
+        previous = self._outputs.get(doc_num)
+        if previous is not None:
+            # A later run with the same document number replaced this one; its earlier file is superseded.
+            previous_filename, previous_size, previous_saved = previous
+            self.stats['bytes_written'] -= previous_size
+            self.stats['bytes_saved'] -= previous_saved
+            if (self.output_format == "files" and previous_filename != output_filename
+                    and os.path.isfile(previous_filename)):
+                os.remove(previous_filename)
+                logging.info(f"Removed {os.path.basename(previous_filename)}; a later run of document "
+                             f"{doc_num} replaced it")
+        self._outputs[doc_num] = (output_filename, size, saved)
+        self.stats['bytes_written'] += size
+        self.stats['bytes_saved'] += saved
+        self.report.add_document(doc_num, elapsed, size)
+        self.progress.written(self._document_pages.get(doc_num, 0), size)
+        if self._manifest is not None and doc_num in self._source_keys:
+            self._manifest.record(doc_num, self._source_keys[doc_num], output_filename, size)
+        page_hash = self._header_hashes.get(doc_num)
+        if self._page_index is not None and page_hash and page_hash not in self._indexed_customers:
+            self._page_index.store_customer(page_hash, customer_info)
+            self._indexed_customers[page_hash] = customer_info
+        self._customers[doc_num] = customer_info
+        if doc_num not in self._written:
+            self._written.add(doc_num)
+            self.stats['processed_count'] += 1
+
     def process_pdfs(self):
-        invoice_file, affidavit_file = self.found_files
-        ym_match = re.search(r'(\d{4})', os.path.basename(invoice_file))
-        ym_code = ym_match.group(1) if ym_match else "0000"
+        ym_code = month_code(self.input_parts['invoice'][0]) or "0000"
         output_dir = self.output_dir or f"{ym_code}_output"
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        logging.info("Extracting document information from invoices...")
-        invoice_docs = self.extract_info_from_pdf(invoice_file)
-        logging.info(f"Found {len(invoice_docs)} invoices.")
-        logging.info("Extracting document information from affidavits...")
-        affidavit_docs = self.extract_info_from_pdf(affidavit_file)
-        logging.info(f"Found {len(affidavit_docs)} affidavits.")
+        source_files = self.input_parts
+        output_name = archive_filename(self.output_format, ym_code)
+        output_path = os.path.join(output_dir, output_name) if output_name else None
+        self.report.start()
+        self.progress.start(sum(open_pdf(path, low_memory=self.low_memory).page_count for path in self.found_files))
+        for path in self.found_files:
+            handle = open_pdf(path, low_memory=self.low_memory)
+            parsed = handle.opened_at >= self.report.started
+            self.report.add_file(path, bytes=handle.size, pages=handle.page_count,
+                                 parse_seconds=round(handle.parse_time, 4), parsed_this_run=parsed)
+            if parsed:
+                self.report.add_bytes_read(handle.size)
+        if self.use_page_index:
+            try:
+                self._page_index = PageIndex(output_dir, self._detector_key(), self.page_index_max_pages)
+            except sqlite3.Error as e:
+                logging.warning(f"Page index unavailable, extracting every page: {e}")
+        if self.incremental:
+            try:
+                self._manifest = OutputManifest(output_dir)
+            except sqlite3.Error as e:
+                logging.warning(f"Output manifest unavailable, writing every document: {e}")
+        status, error = "error", None
+        try:
+            with self.report.profiled():
+                result = self._merge_inputs(source_files, output_dir, output_path)
+            status = "mismatch" if result[1] else "ok"
+            return result
+        except ProcessingCancelled as e:
+            status, error = "cancelled", str(e)
+            self._discard_outputs(output_dir)
+            raise
+        except Exception as e:
+            status = "mismatch" if str(e).startswith("Document count mismatch") else "error"
+            error = str(e)
+            raise
+        finally:
+            if self._page_index is not None:
+                self._page_index.close()
+                self._page_index = None
+            if self._manifest is not None:
+                self._manifest.close()
+                self._manifest = None
+            if self.low_memory:
+                for path in self.found_files:
+                    close_pdf(path)
+            if self.write_report:
+                self._write_report(output_dir, status, error)
+
+    def _write_report(self, output_dir: str, status: str, error: Optional[str]):
+        settings = {
+            'workers': self.workers,
+            'writer_workers': self.writer_workers,
+            'fast_detection': self.fast_detection,
+            'use_page_index': self.use_page_index,
+            'optimize_output': self.optimize_output,
+            'compress_content': self.compress_content,
+            'ignore_mismatches': self.ignore_mismatches,
+            'incremental': self.incremental,
+            'low_memory': self.low_memory,
+            'output_format': self.output_format,
+            'extraction_rules': self.rules.key,
+        }
+        try:
+            self.report_path = self.report.write(output_dir, status, dict(self.stats), settings, error)
+        except (OSError, ValueError) as e:
+            # The report is diagnostics only; it must never hide the run's own result or error.
+            logging.warning(f"Could not write the run report: {e}")
+
+    def _detector_key(self) -> str:
+        """Identifies the detection settings; index entries from other settings are never reused."""
+        mode = f"fast:{self.max_text_ops}:{self.header_region}" if self.fast_detection else "full"
+        return f"{mode}:{self.rules.key}"
 
+    def _merge_inputs(self, source_files: Dict[str, List[str]], output_dir: str, output_path: Optional[str] = None):
+        # All files (every part of both sides) are scanned at once. With ignore_mismatches the merge
+        # is pipelined behind the scan: a document is written to its own file as soon as its page run
+        # is complete on both sides, and written again if a later run with its number replaces it. A
+        # strict run has to see every document number before it may write anything, so it merges afterwards.
+        logging.info("Extracting document information from invoices and affidavits...")
+        handles = {path: open_pdf(path, low_memory=self.low_memory) for path in self.found_files}
+        part_order = {path: order for order, path in enumerate(self.found_files)}
+        page_runs = {side: {} for side in source_files}
+        # Document number -> the part its page run is in, per side.
+        doc_files: Dict[str, Dict[str, str]] = {side: {} for side in source_files}
+        self._written = set()
+        # Document number -> (output filename, bytes written, bytes saved) of its latest write.
+        self._outputs: Dict[str, Tuple[str, int, int]] = {}
+        self._customers: Dict[str, str] = {}
+        duplicates = {side: [] for side in source_files}
+        self._submitted = set()
+        self._header_hashes = {}
+        self._document_pages = {}
+        events = queue.Queue()
+        stop_event = threading.Event()
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        output = open_output(self.output_format, output_path, self.optimize_output,
+                             self.compress_content) if output_path else None
+        writer = _DocumentWriter(self, output_dir, self.writer_workers, output)
+        scanners = [
+            threading.Thread(target=self._scan_to_queue, args=(side, path, executor, events, stop_event), daemon=True)
+            for side, paths in source_files.items() for path in paths
+        ]
+        for scanner in scanners:
+            scanner.start()
+        scan_start = time.perf_counter()
+        stop_workers = False
+        try:
+            running = len(scanners)
+            while running:
+                event = self._next_event(events)
+                kind, side = event[0], event[1]
+                if kind == "error":
+                    raise event[2]
+                if kind == "done":
+                    running -= 1
+                    found = sum(1 for path in doc_files[side].values() if path == event[2])
+                    logging.info(f"Found {found} {side}s in {os.path.basename(event[2])}.")
+                    continue
+                path, doc_num, page_indices = event[2], event[3], event[4]
+                # A repeated document number replaces the earlier run, as in extract_info_from_pdf.
+                # Across parts the later file wins, whichever scanner reports first.
+                if doc_num in page_runs[side]:
+                    duplicates[side].append(doc_num)
+                    if part_order[doc_files[side][doc_num]] > part_order[path]:
+                        continue
+                page_runs[side][doc_num] = page_indices
+                doc_files[side][doc_num] = path
+                # A ZIP entry or combined-PDF pages cannot be taken back when a later run replaces a
+                # document, so those outputs are only merged once the scan is complete.
+                complete = all(doc_num in runs for runs in page_runs.values())
+                if self.ignore_mismatches and output is None and complete:
+                    if doc_num in self._submitted:
+                        # Merged already from the run this one replaces: that write has to land (and
+                        # be recorded) before the rewrite, which also removes it if its name differs.
+                        writer.wait_for(doc_num)
+                    self._merge_document(doc_num, handles, page_runs, doc_files, writer)
+        except BaseException:
+            # Whatever the other scans find would be thrown away.
+            stop_workers = True
+            writer.close(cancel=True)
+            raise
+        finally:
+            stop_event.set()
+            if executor and stop_workers:
+                # Before the join: a scanner may be waiting for one of these workers' chunks.
+                _stop_workers(executor)
+            for scanner in scanners:
+                scanner.join()
+            if executor:
+                executor.shutdown()
+            self.report.add_stage("scan", time.perf_counter() - scan_start)
+
+        matching_start = time.perf_counter()
+        # File order, then page order, whatever order the scanners finished in.
+        for side, runs in page_runs.items():
+            page_runs[side] = dict(sorted(runs.items(), key=lambda run: (part_order[doc_files[side][run[0]]], run[1][0])))
+        invoice_docs, affidavit_docs = page_runs['invoice'], page_runs['affidavit']
         self.stats['invoice_count'] = len(invoice_docs)
         self.stats['affidavit_count'] = len(affidavit_docs)
 
@@ -103,6 +808,23 @@ class PDFProcessor:
         affidavit_doc_numbers = set(affidavit_docs.keys())
         missing_invoices = affidavit_doc_numbers - invoice_doc_numbers
         missing_affidavits = invoice_doc_numbers - affidavit_doc_numbers
+        # Orphans are few, so their customer names may be extracted; they make the best suggestions.
+        # Only pages of the customer page types name one: with the default rules that leaves affidavits
+        # out, so an orphan affidavit is only matched by its number.
+        for side, orphans in (('invoice', missing_affidavits), ('affidavit', missing_invoices)):
+            if side not in self.rules.customer_page_types:
+                continue
+            for doc_num in orphans:
+                self._customers[doc_num] = self._page_customer(handles[doc_files[side][doc_num]],
+                                                               page_runs[side][doc_num][0])
+        file_names = {side: {doc_num: os.path.basename(path) for doc_num, path in files.items()}
+                      for side, files in doc_files.items()}
+        match_report = build_match_report(invoice_docs, affidavit_docs, self._customers, duplicates, file_names)
+        for side, doc_numbers in duplicates.items():
+            if doc_numbers:
+                logging.warning(f"Repeated document numbers in the {side} file (last one kept): "
+                                f"{', '.join(sorted(set(doc_numbers)))}")
+        self.report.add_stage("matching", time.perf_counter() - matching_start)
 
         mismatch_details = []
         if missing_invoices or missing_affidavits:
@@ -110,44 +832,77 @@ class PDFProcessor:
                 mismatch_details.append(f"Missing invoices: {', '.join(sorted(missing_invoices))}")
             if missing_affidavits:
                 mismatch_details.append(f"Missing affidavits: {', '.join(sorted(missing_affidavits))}")
+            mismatch_details.extend(suggestion_lines(match_report))
             if not self.ignore_mismatches:
+                writer.close(cancel=True)
+                self._write_match_report(match_report, output_dir)
                 raise ValueError("Document count mismatch:\n" + "\n".join(mismatch_details))
-            common_docs = invoice_doc_numbers & affidavit_doc_numbers
-            invoice_docs = {k: v for k, v in invoice_docs.items() if k in common_docs}
-            affidavit_docs = {k: v for k, v in affidavit_docs.items() if k in common_docs}
             logging.warning("\n".join(mismatch_details))
 
         logging.info("Merging documents...")
-        for doc_num in invoice_docs:
+        self.progress.set_stage("merging", pages_to_write=sum(
+            len(page_indices) + len(affidavit_docs[doc_num])
+            for doc_num, page_indices in invoice_docs.items() if doc_num in affidavit_docs))
+        with self.report.stage("merge"):
             try:
-                writer = PdfWriter()
-                # Debug log for writer
-                logging.info(f"Created writer for document {doc_num}: {writer}")
-
-                valid_invoice_pages = [page for page in invoice_docs[doc_num] if page is not None]
-                valid_affidavit_pages = [page for page in affidavit_docs[doc_num] if page is not None]
+                for doc_num in invoice_docs:
+                    if doc_num in affidavit_docs and doc_num not in self._submitted:
+                        self._merge_document(doc_num, handles, page_runs, doc_files, writer)
+            except BaseException:
+                writer.close(cancel=True)
+                raise
+            writer.close()
+        if output is not None:
+            # What reached the disk is the single file, not the documents inside it.
+            self.stats['bytes_written'] = output.size
+            self.stats['bytes_saved'] += output.saved
+            self.output_path = output.path
 
-                for page in valid_invoice_pages:
-                    writer.add_page(page)
-                for page in valid_affidavit_pages:
-                    writer.add_page(page)
+        # Customer names are known now for everything that was written.
+        for doc_num in invoice_docs:
+            if doc_num not in self._customers:
+                self._customers[doc_num] = self._known_customer(handles[doc_files['invoice'][doc_num]],
+                                                                invoice_docs[doc_num][0])
+        self._write_match_report(build_match_report(invoice_docs, affidavit_docs, self._customers, duplicates,
+                                                    file_names), output_dir)
+        self.progress.set_stage("done")
+        log_parse_summary(self.found_files)
+        logging.info(f"Processing complete! Output files are in the '{output_dir}' directory.")
+        return self.stats, mismatch_details if (missing_invoices or missing_affidavits) else None
 
-                if not writer.pages:
-                    logging.warning(f"No valid pages for document {doc_num}; skipping file creation.")
-                    continue
+    def _write_match_report(self, match_report: dict, output_dir: str):
+        try:
+            self.match_report_path = write_match_report(match_report, output_dir)
+        except OSError as e:
+            logging.warning(f"Could not write the match report: {e}")
 
-                invoice_text = valid_invoice_pages[0].extract_text() if valid_invoice_pages else ""
-                customer_info = self.extract_customer_info_from_invoice(invoice_text)
-                sanitized_customer_info = FileValidator.sanitize_filename(customer_info)
-                output_filename = os.path.join(output_dir, f"{doc_num} {sanitized_customer_info}.pdf")
-                logging.info(f"Writing output file: {output_filename}")
-                with open(output_filename, 'wb') as output_file:
-                    writer.write(output_file)
-                self.stats['processed_count'] += 1
-                logging.info(f"Processed document {doc_num}.")
-            except Exception as e:
-                logging.error(f"Error processing document {doc_num}: {e}")
-                continue
+    def _merge_document(self, doc_num: str, handles: Dict[str, PdfHandle], page_runs: Dict[str, Dict[str, List[int]]],
+                        doc_files: Dict[str, Dict[str, str]], writer: _DocumentWriter):
+        invoice_indices = page_runs['invoice'][doc_num]
+        affidavit_indices = page_runs['affidavit'][doc_num]
+        invoice, affidavit = handles[doc_files['invoice'][doc_num]], handles[doc_files['affidavit'][doc_num]]
+        self._check_cancelled()
+        self._submitted.add(doc_num)
+        self._document_pages[doc_num] = len(invoice_indices) + len(affidavit_indices)
+        self.progress.matched()
+        if self._manifest is not None:
+            key = source_key(self._source_page_hashes(invoice, invoice_indices)
+                             + self._source_page_hashes(affidavit, affidavit_indices),
+                             f"{self.optimize_output}:{self.compress_content}:{self.rules.key}")
+            if self._manifest.is_current(doc_num, key):
+                logging.info(f"Document {doc_num} is up to date; skipping.")
+                self._written.add(doc_num)
+                self.stats['skipped_count'] += 1
+                self.progress.written(self._document_pages[doc_num], 0)
+                return
+            self._source_keys[doc_num] = key
+        customer_info = self._known_customer(invoice, invoice_indices[0])
+        page_hashes = self._page_hashes.get(invoice.path)
+        if page_hashes:
+            self._header_hashes[doc_num] = page_hashes[invoice_indices[0]]
+        writer.submit(doc_num, invoice.path, invoice_indices, affidavit.path, affidavit_indices, customer_info)
 
-        logging.info(f"Processing complete! Output files are in the '{output_dir}' directory.")
-        return self.stats, mismatch_details if (missing_invoices or missing_affidavits) else None
\ No newline at end of file
+    def _source_page_hashes(self, handle: PdfHandle, indices: List[int]) -> List[str]:
+        # Not the detection fingerprints: those leave out images and whatever else carries no text.
+        with handle.lock:
+            return [page_content_hash(handle.page(index)) for index in indices]
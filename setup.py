@@ -7,7 +7,7 @@ build_exe_options = {
         "os", "re", "logging", "json", "time", "queue",
         "threading", "datetime", "PyPDF2", "ttkbootstrap", "tkinter"
     ],
-    "excludes": [],
+    "excludes": ["tqdm", "unittest", "pydoc", "doctest", "lib2to3", "test", "ttkthemes"],
 }
 
 # On Windows, use "Win32GUI" to hide the console.
@@ -20,5 +20,10 @@ setup(
     version="1.0",
     description="Invoice and Affidavit Merger",
     options={"build_exe": build_exe_options},
-    executables=[Executable("main.py", base=base)]
+    executables=[
+        Executable("main.py", base=base),
+        # Console entry point for unattended batch runs.
+        Executable("cli.py", target_name="Invoice_Merger_CLI"),
+        Executable("watch.py", target_name="Invoice_Merger_Watch"),
+    ]
 )
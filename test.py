@@ -1,16 +1,420 @@
-from pdf_processor import PDFProcessor
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import tempfile
+import subprocess
+from unittest import mock
 
-def test_extract_invoice_balance():
-    processor = PDFProcessor()
-    text = "Invoice Balance $1,372.75"
-    assert processor.extract_invoice_balance(text) == 1372.75
+from PyPDF2 import PdfReader
 
-    text = "Total $912.05"
-    assert processor.extract_invoice_balance(text) == 912.05
+from benchmarks.startup_benchmark import (CLI_STARTUP_BUDGET, GUI_STARTUP_BUDGET, gui_available, measure_cli,
+                                          measure_gui)
+from benchmarks.synthetic import build_pdf, customer_name, write_month, write_split_month
+from cli import discover_jobs, run_job
+from job_queue import JobQueue
+from pdf_processor import PDFProcessor, detect_document_number
+from utils.extraction_rules import DEFAULT_RULES
+from utils.stats import StatsTracker
+from watch import FolderWatcher
 
-    text = "No balance here"
-    assert processor.extract_invoice_balance(text) == 0.0
+# Set to run the start-up time budgets as well, e.g. INVOICE_MERGER_TIMING_TESTS=1 python test.py
+TIMING_TESTS_ENV = "INVOICE_MERGER_TIMING_TESTS"
 
-# Call the test function
-test_extract_invoice_balance()
-print("All tests passed!")
\ No newline at end of file
+
+def test_extract_customer_info_from_invoice():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_month(tmp, documents=1)
+        processor = PDFProcessor(tmp)
+        assert processor.extract_customer_info_from_invoice("Invoice # 2025-001\nBill To\n ACME Radio \n") == "ACME Radio"
+        assert processor.extract_customer_info_from_invoice("Bill To") == "UNKNOWN"
+        assert processor.extract_customer_info_from_invoice("No customer here") == "UNKNOWN"
+
+
+def test_extraction_rules_from_config_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_month(tmp, documents=1)
+        rules_file = os.path.join(tmp, "rules.json")
+        with open(rules_file, "w") as f:
+            json.dump({"page_types": {"invoice": [r"Invoice #\s*(\d{4}-\d{3})"],
+                                      "credit_memo": [r"Credit Memo\s+CM-(\d{6})"]},
+                       "customer_anchors": ["Sold To", "Bill To"]}, f)
+        processor = PDFProcessor(tmp, rules_file=rules_file)
+        fields = processor.rules.extract("Credit Memo CM-000042\nSold To\n ACME Radio \nInvoice # 2025-001\n")
+        assert fields == ("000042", "credit_memo", "ACME Radio")
+        assert processor.rules.extract("Page 2 of 3\nBill To\n\nX") == (None, None, "")
+        assert processor._detector_key() != PDFProcessor(tmp)._detector_key()
+        with open(rules_file, "w") as f:
+            json.dump({"page_types": {"invoice": [r"Invoice #\s*\d{4}-\d{3}"]}}, f)
+        try:
+            PDFProcessor(tmp, rules_file=rules_file)
+        except ValueError as e:
+            assert "capture group" in str(e)
+        else:
+            raise AssertionError("a pattern without a capture group was accepted")
+
+
+def test_extract_info_from_pdf():
+    with tempfile.TemporaryDirectory() as tmp:
+        invoice_file, affidavit_file = write_month(tmp, documents=4, invoice_pages=2, affidavit_pages=3)
+        processor = PDFProcessor(tmp)
+        invoices = processor.extract_info_from_pdf(invoice_file)
+        affidavits = processor.extract_info_from_pdf(affidavit_file)
+        assert list(invoices) == ["2025-001", "2025-002", "2025-003", "2025-004"]
+        assert [len(pages) for pages in invoices.values()] == [2, 2, 2, 2]
+        assert [len(pages) for pages in affidavits.values()] == [3, 3, 3, 3]
+
+
+def test_parallel_and_fast_detection_match_serial():
+    with tempfile.TemporaryDirectory() as tmp:
+        invoice_file, _ = write_month(tmp, documents=40, invoice_pages=2)
+
+        def page_numbers(processor):
+            documents = processor.extract_info_from_pdf(invoice_file)
+            return {doc: [page.indirect_reference.idnum for page in pages] for doc, pages in documents.items()}
+
+        serial = page_numbers(PDFProcessor(tmp))
+        assert page_numbers(PDFProcessor(tmp, workers=2)) == serial
+        assert page_numbers(PDFProcessor(tmp, fast_detection=True)) == serial
+
+
+def test_fast_detection_decodes_remapped_fonts_through_their_cmap():
+    # Each character code is one above its character; only the font's ToUnicode CMap says so.
+    reader = PdfReader(io.BytesIO(build_pdf("invoice", [("2025-001", 1)], 1, remapped_fonts=True)))
+    assert detect_document_number(reader.pages[0], fast_detection=True) == ("2025-001", customer_name(1))
+
+
+def test_process_pdfs_merges_matching_documents():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_month(os.path.join(tmp, "input"), documents=3, invoice_pages=1, affidavit_pages=2)
+        output_dir = os.path.join(tmp, "output")
+        events = []
+        stats, mismatches = PDFProcessor(os.path.join(tmp, "input"), output_dir=output_dir,
+                                         progress_callback=events.append).process_pdfs()
+        assert mismatches is None
+        assert [event['stage'] for event in events][-2:] == ["merging", "done"]
+        assert events[-1]['pages_scanned'] == 9 and events[-1]['files_written'] == 3
+        assert stats['processed_count'] == 3
+        merged = os.path.join(output_dir, f"2025-002 {customer_name(2)}.pdf")
+        assert len(PdfReader(merged).pages) == 3
+        with open(os.path.join(output_dir, "run_report.json")) as f:
+            report = json.load(f)
+        assert report['status'] == "ok"
+        assert report['pages']['count'] == 9 and report['documents']['count'] == 3
+        assert {'validation', 'scan', 'matching', 'merge'} <= set(report['stages'])
+
+
+def test_match_report_suggests_near_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, "input"), os.path.join(tmp, "output")
+        _, affidavit_file = write_month(input_dir, documents=4, invoice_pages=1, affidavit_pages=1)
+        # Affidavit 2025-003 was keyed in as 2025-008.
+        with open(affidavit_file, "wb") as f:
+            f.write(build_pdf("affidavit", [("2025-001", 1), ("2025-002", 2), ("2025-008", 3), ("2025-004", 4)], 1))
+        try:
+            PDFProcessor(input_dir, output_dir=output_dir).process_pdfs()
+        except ValueError as e:
+            assert "Invoice 2025-003 may belong with affidavit 2025-008 (digit confusion)" in str(e)
+        else:
+            raise AssertionError("mismatch was not reported")
+        with open(os.path.join(output_dir, "match_report.json")) as f:
+            report = json.load(f)
+        assert report['counts']['matched'] == 3
+        [orphan] = report['missing_affidavits']
+        assert orphan['customer'] == customer_name(3) and orphan['pages'] == [3, 3]
+        assert orphan['candidates'][0]['document'] == "2025-008"
+
+
+def test_match_report_suggests_same_customer_when_affidavits_name_it():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, "input"), os.path.join(tmp, "output")
+        os.makedirs(input_dir)
+        with open(os.path.join(input_dir, "2501_invoice.pdf"), "wb") as f:
+            f.write(build_pdf("invoice", [("2025-001", 1), ("2025-002", 2), ("2025-003", 3)], 1))
+        # Affidavit 2025-003 was keyed in as 2025-050: no near miss, but the same customer.
+        with open(os.path.join(input_dir, "2501_affidavit.pdf"), "wb") as f:
+            f.write(build_pdf("affidavit", [("2025-001", 1), ("2025-002", 2), ("2025-050", 3)], 1,
+                              affidavit_customers=True))
+        rules_file = os.path.join(tmp, "rules.json")
+        with open(rules_file, "w") as f:
+            json.dump(dict(DEFAULT_RULES, customer_page_types=["invoice", "affidavit"]), f)
+        try:
+            PDFProcessor(input_dir, output_dir=output_dir, rules_file=rules_file).process_pdfs()
+        except ValueError as e:
+            assert "Invoice 2025-003 may belong with affidavit 2025-050 (same customer)" in str(e)
+        else:
+            raise AssertionError("mismatch was not reported")
+        with open(os.path.join(output_dir, "match_report.json")) as f:
+            report = json.load(f)
+        [orphan] = report['missing_invoices']
+        assert orphan['customer'] == customer_name(3)
+        assert orphan['candidates'] == [{'document': "2025-003", 'reason': "same customer", 'score': 0.3}]
+
+
+def test_incremental_run_rewrites_only_missing_outputs():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, "input"), os.path.join(tmp, "output")
+        write_month(input_dir, documents=3, invoice_pages=1, affidavit_pages=1)
+        stats, _ = PDFProcessor(input_dir, output_dir=output_dir, incremental=True).process_pdfs()
+        assert (stats['processed_count'], stats['skipped_count']) == (3, 0)
+        os.remove(os.path.join(output_dir, f"2025-002 {customer_name(2)}.pdf"))
+        stats, _ = PDFProcessor(input_dir, output_dir=output_dir, incremental=True).process_pdfs()
+        assert (stats['processed_count'], stats['skipped_count']) == (1, 2)
+
+
+def test_page_index_scans_changed_pages_in_the_pool():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "input")
+        for fast_detection in (False, True):
+            output_dir = os.path.join(tmp, f"output{int(fast_detection)}")
+            write_month(input_dir, documents=10)
+            PDFProcessor(input_dir, output_dir=output_dir, fast_detection=fast_detection).process_pdfs()
+            # Only the header pages of the 90 new documents are unknown: enough to split over the workers.
+            write_month(input_dir, documents=100)
+            processor = PDFProcessor(input_dir, output_dir=output_dir, workers=2, fast_detection=fast_detection)
+            with mock.patch.object(PDFProcessor, "_scan_pages_parallel", autospec=True,
+                                   side_effect=PDFProcessor._scan_pages_parallel) as scan:
+                stats, _ = processor.process_pdfs()
+            assert stats['processed_count'] == 100
+            assert processor.report.pages_from_index == 500 - 2 * 90
+            assert scan.called
+
+
+def test_incremental_run_rewrites_documents_whose_images_changed():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, "input"), os.path.join(tmp, "output")
+        for logo_variant, expected in ((0, (3, 0)), (0, (0, 3)), (1, (3, 0))):
+            # Same text every time; only the logo's pixels change in the last run.
+            write_month(input_dir, documents=3, invoice_pages=1, affidavit_pages=1, images=1,
+                        logo_variant=logo_variant)
+            stats, _ = PDFProcessor(input_dir, output_dir=output_dir, incremental=True).process_pdfs()
+            assert (stats['processed_count'], stats['skipped_count']) == expected
+
+
+def test_page_index_tells_pages_drawn_from_forms_apart():
+    # Every page's own content stream is "q /X0 Do Q"; the text is in the form it draws.
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, "input"), os.path.join(tmp, "output")
+        write_month(input_dir, documents=3, invoice_pages=1, affidavit_pages=1, text_in_forms=True)
+        for pages_from_index in (0, 6):
+            processor = PDFProcessor(input_dir, output_dir=output_dir)
+            stats, _ = processor.process_pdfs()
+            assert stats['processed_count'] == 3
+            assert processor.report.pages_from_index == pages_from_index
+
+
+def test_low_memory_output_matches_default():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "input")
+        write_month(input_dir, documents=4, invoice_pages=2, affidavit_pages=2, images=1, shared_images=False)
+        outputs = {}
+        for low_memory in (False, True):
+            output_dir = os.path.join(tmp, f"output_{low_memory}")
+            stats, _ = PDFProcessor(input_dir, output_dir=output_dir, use_page_index=False,
+                                    low_memory=low_memory).process_pdfs()
+            assert stats['processed_count'] == 4
+            outputs[low_memory] = {}
+            for name in sorted(os.listdir(output_dir)):
+                if name.endswith(".pdf"):
+                    with open(os.path.join(output_dir, name), 'rb') as f:
+                        outputs[low_memory][name] = f.read()
+        assert outputs[True] == outputs[False]
+
+
+def test_optimized_output_matches_default():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "input")
+        # Every page embeds its own copy of the logo, and the content streams are not compressed.
+        write_month(input_dir, documents=3, invoice_pages=2, affidavit_pages=2, images=1, shared_images=False,
+                    compress=False)
+        outputs = {}
+        for name, options in (("default", {}), ("optimized", {'optimize_output': True, 'compress_content': True})):
+            outputs[name] = os.path.join(tmp, name)
+            stats, _ = PDFProcessor(input_dir, output_dir=outputs[name], **options).process_pdfs()
+            assert stats['processed_count'] == 3
+            if name == "optimized":
+                assert stats['bytes_saved'] > 0
+        for filename in sorted(name for name in os.listdir(outputs['default']) if name.endswith(".pdf")):
+            default, optimized = (os.path.join(outputs[name], filename) for name in ("default", "optimized"))
+            assert os.path.getsize(optimized) < os.path.getsize(default)
+            pages = {name: PdfReader(path).pages for name, path in (("default", default), ("optimized", optimized))}
+            assert ([page.extract_text() for page in pages['optimized']]
+                    == [page.extract_text() for page in pages['default']])
+            # Each page still draws the logo, now shared with the other pages.
+            assert ([page['/Resources']['/XObject']['/Im0'].get_data() for page in pages['optimized']]
+                    == [page['/Resources']['/XObject']['/Im0'].get_data() for page in pages['default']])
+
+
+def test_split_export_pairs_documents_across_parts():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = os.path.join(tmp, "input"), os.path.join(tmp, "output")
+        invoice_files, affidavit_files = write_split_month(input_dir, documents=7, invoice_parts=2, affidavit_parts=3,
+                                                           invoice_pages=1, affidavit_pages=2)
+        processor = PDFProcessor(input_dir, output_dir=output_dir, workers=2)
+        assert processor.found_files == tuple(invoice_files + affidavit_files)
+        stats, mismatches = processor.process_pdfs()
+        assert mismatches is None
+        assert (stats['invoice_count'], stats['affidavit_count'], stats['processed_count']) == (7, 7, 7)
+        merged = PdfReader(os.path.join(output_dir, f"2025-004 {customer_name(4)}.pdf"))
+        assert len(merged.pages) == 3
+        with open(os.path.join(output_dir, "match_report.json")) as f:
+            matched = {entry['document']: entry for entry in json.load(f)['matched']}
+        assert matched["2025-004"]['invoice_file'] == "2501_invoice_part2.pdf"
+        assert matched["2025-004"]['affidavit_file'] == "2501_affidavit_part2.pdf"
+
+
+def test_zip_and_combined_pdf_outputs():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "input")
+        write_month(input_dir, documents=3, invoice_pages=1, affidavit_pages=2)
+        names = [f"2025-00{number} {customer_name(number)}.pdf" for number in (1, 2, 3)]
+        processor = PDFProcessor(input_dir, output_dir=os.path.join(tmp, "zip"), output_format="zip")
+        processor.process_pdfs()
+        with zipfile.ZipFile(processor.output_path) as archive:
+            assert sorted(archive.namelist()) == names
+            assert len(PdfReader(io.BytesIO(archive.read(names[1]))).pages) == 3
+        processor = PDFProcessor(input_dir, output_dir=os.path.join(tmp, "pdf"), output_format="pdf")
+        stats, _ = processor.process_pdfs()
+        assert stats['processed_count'] == 3 and stats['bytes_written'] == os.path.getsize(processor.output_path)
+        combined = PdfReader(processor.output_path)
+        assert len(combined.pages) == 9
+        assert [item.title for item in combined.outline] == [name[:-4] for name in names]
+        assert [combined.get_destination_page_number(item) for item in combined.outline] == [0, 3, 6]
+        assert not any(name.endswith(".part") for name in os.listdir(os.path.join(tmp, "pdf")))
+        try:
+            PDFProcessor(input_dir, output_format="zip", incremental=True)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("incremental zip output was accepted")
+
+
+def test_mismatch_raises_unless_ignored():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "input")
+        write_month(input_dir, documents=3, missing_affidavits=1)
+        try:
+            PDFProcessor(input_dir, output_dir=os.path.join(tmp, "strict")).process_pdfs()
+        except ValueError as e:
+            assert "Missing affidavits: 2025-003" in str(e)
+        else:
+            raise AssertionError("mismatch was not reported")
+        stats, mismatches = PDFProcessor(input_dir, output_dir=os.path.join(tmp, "lenient"),
+                                         ignore_mismatches=True).process_pdfs()
+        assert stats['processed_count'] == 2
+        assert mismatches == ["Missing affidavits: 2025-003"]
+
+
+def test_repeated_document_number_keeps_only_the_last_run():
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir = os.path.join(tmp, "input")
+        os.makedirs(input_dir)
+        with open(os.path.join(input_dir, "2501_invoice.pdf"), "wb") as f:
+            f.write(build_pdf("invoice", [("2025-001", 1), ("2025-002", 2), ("2025-001", 9)], 1))
+        with open(os.path.join(input_dir, "2501_affidavit.pdf"), "wb") as f:
+            f.write(build_pdf("affidavit", [("2025-001", 1), ("2025-002", 2)], 1))
+        for options in ({}, {'ignore_mismatches': True}, {'ignore_mismatches': True, 'writer_workers': 2}):
+            output_dir = os.path.join(tmp, f"output{len(options)}")
+            stats, _ = PDFProcessor(input_dir, output_dir=output_dir, **options).process_pdfs()
+            assert stats['processed_count'] == 2
+            assert sorted(name for name in os.listdir(output_dir) if name.endswith(".pdf")) == [
+                f"2025-001 {customer_name(9)}.pdf", f"2025-002 {customer_name(2)}.pdf"]
+            assert stats['bytes_written'] == sum(os.path.getsize(os.path.join(output_dir, name))
+                                                 for name in os.listdir(output_dir) if name.endswith(".pdf"))
+
+
+def test_folder_watcher_waits_for_settled_pairs():
+    with tempfile.TemporaryDirectory() as tmp:
+        watcher = FolderWatcher([tmp], settle=2.0)
+        assert watcher.poll(now=0.0) == []
+        invoice_file, affidavit_file = write_month(tmp, documents=1)
+        assert watcher.poll(now=1.0) == []
+        [job] = watcher.poll(now=3.5)
+        assert job['input_files'] == (invoice_file, affidavit_file)
+        assert watcher.poll(now=10.0) == []
+        write_month(tmp, documents=2)
+        assert watcher.poll(now=11.0) == []
+        assert len(watcher.poll(now=13.5)) == 1
+
+
+def test_watch_and_batch_modes_make_one_job_per_month():
+    with tempfile.TemporaryDirectory() as tmp:
+        invoice_files, affidavit_files = write_split_month(tmp, documents=7, invoice_parts=2, affidavit_parts=3,
+                                                           invoice_pages=1, affidavit_pages=1)
+        february = write_month(tmp, documents=2, invoice_pages=1, affidavit_pages=1, month=2)
+        # March has no affidavits yet.
+        write_month(os.path.join(tmp, "march"), documents=1, month=3)
+        os.replace(os.path.join(tmp, "march", "2503_invoice.pdf"), os.path.join(tmp, "2503_invoice.pdf"))
+        jobs = FolderWatcher([tmp], settle=0).poll(now=0.0)
+        assert [job['input_files'] for job in jobs] == [tuple(invoice_files + affidavit_files), february]
+        assert [job['output_dir'] for job in jobs] == [os.path.join(tmp, f"{month}_output") for month in ("2501", "2502")]
+        batch_jobs = discover_jobs([os.path.join(tmp, "*.pdf")])
+        assert batch_jobs[:2] == jobs and "No affidavit files" in batch_jobs[2]['error']
+        results = [run_job(job, {}) for job in jobs]
+        assert [(result['status'], result['processed_count']) for result in results] == [("ok", 7), ("ok", 2)]
+
+
+def test_job_queue_runs_jobs_in_turn_and_cancels_cleanly():
+    with tempfile.TemporaryDirectory() as tmp:
+        folders = {name: os.path.join(tmp, name) for name in ("small", "large", "later")}
+        for name, documents in (("small", 3), ("large", 300), ("later", 2)):
+            os.makedirs(folders[name])
+            write_month(folders[name], documents=documents)
+        jobs = JobQueue()
+        small, large, later = (jobs.add(folder, os.path.join(folder, "out"), {'writer_workers': 2})
+                               for folder in folders.values())
+        jobs.cancel(later['id'])
+        deadline = time.monotonic() + 120
+        while jobs.busy() and time.monotonic() < deadline:
+            if small in jobs.poll():
+                # Started as soon as the result arrives, not once the finished job's process has exited.
+                assert large['status'] == "running"
+            # Cancelled once it has written some documents, so there is partial output to remove.
+            if large['status'] == "running" and large['progress'] and large['progress']['files_written']:
+                jobs.cancel(large['id'])
+            time.sleep(0.05)
+        assert (small['status'], large['status'], later['status']) == ("ok", "cancelled", "cancelled")
+        assert small['result']['processed_count'] == 3
+        assert not [name for name in os.listdir(os.path.join(folders['large'], "out"))
+                    if name.endswith((".pdf", ".part"))]
+        assert not os.path.exists(os.path.join(folders['later'], "out"))
+
+
+def test_stats_tracker_keeps_runs_and_daily_totals():
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = StatsTracker(os.path.join(tmp, "stats.sqlite"), legacy_file=None)
+        tracker.record_run("cli", "ok", 2.0, {'processed_count': 5, 'bytes_written': 100}, pages=20,
+                           stages={'scan': 1.5})
+        tracker.record_run("gui", "error", 1.0, error="boom")
+        today = tracker.get_today_stats()
+        assert (today['processed_count'], today['error_count'], today['documents'], today['pages']) == (2, 1, 5, 20)
+        assert today['total_time'] == 3.0 and today['success_rate'] == 50.0
+        tracker.close()
+
+
+def test_startup_does_not_load_pypdf2():
+    check = "import sys, cli; print('PyPDF2' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", check], cwd=os.path.dirname(os.path.abspath(__file__)),
+                            check=True, capture_output=True, text=True).stdout
+    assert output.strip() == "False"
+    # The GUI part needs Tk, ttkbootstrap and a display.
+    if gui_available():
+        assert not measure_gui([sys.executable, "main.py"], runs=1)['pypdf2_before_first_frame']
+
+
+def test_startup_within_budget():
+    # Wall-clock timings are only reliable on an idle machine, so they are opt-in.
+    if not os.environ.get(TIMING_TESTS_ENV):
+        return
+    assert measure_cli(runs=3)['median'] <= CLI_STARTUP_BUDGET
+    if gui_available():
+        assert measure_gui([sys.executable, "main.py"], runs=3)['median'] <= GUI_STARTUP_BUDGET
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+    print("All tests passed!")
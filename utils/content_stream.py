@@ -0,0 +1,157 @@
+import re
+from typing import Optional
+
+from PyPDF2.generic import ArrayObject
+
+# One token of a page content stream: literal string, hex string, array bracket, name, number or operator.
+_TOKEN_PATTERN = re.compile(
+    rb"\((?:\\.|[^\\()])*\)"
+    rb"|<[0-9A-Fa-f\s]*>"
+    rb"|[\[\]]"
+    rb"|/[^\s/\[\]()<>{}%]*"
+    rb"|[-+]?(?:\d+\.?\d*|\.\d+)"
+    rb"|[A-Za-z'\"*]+"
+    rb"|%[^\r\n]*",
+    re.DOTALL,
+)
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+_ESCAPE_PATTERN = re.compile(rb"\\([0-7]{1,3}|\r\n|[\r\n]|.)", re.DOTALL)
+# Font types whose string bytes are not plain single-byte character codes.
+_COMPLEX_FONT_TYPES = ("/Type0", "/Type3")
+# TJ kerning (thousandths of an em) wide enough that extract_text treats it as a word gap.
+_WORD_GAP = -250
+
+
+def _decode_literal(token: bytes) -> str:
+    def unescape(match):
+        escaped = match.group(1)
+        if escaped[:1].isdigit():
+            return bytes([int(escaped, 8) & 0xFF])
+        if escaped in (b"\r\n", b"\r", b"\n"):
+            return b""
+        return _ESCAPES.get(escaped, escaped)
+    return _ESCAPE_PATTERN.sub(unescape, token[1:-1]).decode("latin-1")
+
+
+def _decode_string(token: bytes) -> str:
+    if token.startswith(b"("):
+        return _decode_literal(token)
+    hex_digits = re.sub(rb"\s", b"", token[1:-1])
+    if len(hex_digits) % 2:
+        hex_digits += b"0"
+    return bytes.fromhex(hex_digits.decode("ascii")).decode("latin-1")
+
+
+def has_simple_fonts(page) -> bool:
+    """True when every font on the page maps string bytes straight to characters."""
+    resources = page.get("/Resources")
+    fonts = resources.get_object().get("/Font") if resources is not None else None
+    if fonts is None:
+        return True
+    for font_ref in fonts.get_object().values():
+        font = font_ref.get_object()
+        if font.get("/Subtype") in _COMPLEX_FONT_TYPES or "/ToUnicode" in font:
+            # extract_text() decodes through the ToUnicode CMap; the raw bytes may mean something else.
+            return False
+        encoding = font.get("/Encoding")
+        if encoding is not None and not isinstance(encoding.get_object(), str):
+            # An encoding dictionary with /Differences remaps codes; the raw bytes can't be trusted.
+            return False
+    return True
+
+
+def extract_header_text(page, max_text_ops: int = 60, header_region: Optional[float] = None) -> str:
+    """
+    Decode text from the start of a page's content stream without PyPDF2's full layout pass.
+
+    Stops after max_text_ops text-show operators. When header_region is set, only text whose
+    baseline lies in that top fraction of the page is kept. Positions follow Td/TD/Tm/T* only
+    (the cm matrix is ignored), so callers should fall back to extract_text() when nothing useful
+    comes back.
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return ""
+    if isinstance(contents, ArrayObject):
+        data = b"\n".join(part.get_object().get_data() for part in contents)
+    else:
+        data = contents.get_data()
+
+    min_y = None
+    if header_region is not None:
+        media_box = page.mediabox
+        min_y = float(media_box.top) - float(media_box.height) * header_region
+
+    lines = []
+    current_line = []
+    operands = []
+    array = None
+    leading = 0.0
+    line_y = y = 0.0
+    shown = 0
+
+    def show(text):
+        if min_y is None or y >= min_y:
+            current_line.append(text)
+
+    def new_line():
+        if current_line:
+            lines.append("".join(current_line))
+            current_line.clear()
+
+    for match in _TOKEN_PATTERN.finditer(data):
+        token = match.group()
+        first = token[:1]
+        if first == b"%":
+            continue
+        if first in (b"(", b"<"):
+            (array if array is not None else operands).append(_decode_string(token))
+        elif token == b"[":
+            array = []
+        elif token == b"]":
+            operands.append(array or [])
+            array = None
+        elif first == b"/":
+            operands.append(token)
+        elif first.isalpha() or first in (b"'", b'"', b"*"):
+            operator = token
+            if operator == b"BI":
+                # Inline image data is binary; the tokenizer can't safely continue past it.
+                break
+            if operator == b"BT":
+                line_y = y = 0.0
+            elif operator in (b"Td", b"TD") and len(operands) >= 2:
+                line_y = y = line_y + float(operands[-1])
+                if operator == b"TD":
+                    leading = -float(operands[-1])
+                if float(operands[-1]):
+                    new_line()
+            elif operator == b"Tm" and len(operands) >= 6:
+                if float(operands[-1]) != line_y:
+                    new_line()
+                line_y = y = float(operands[-1])
+            elif operator == b"TL" and operands:
+                leading = float(operands[-1])
+            elif operator in (b"T*", b"'", b'"'):
+                line_y = y = line_y - leading
+                new_line()
+            if operator in (b"Tj", b"'", b'"') and operands and isinstance(operands[-1], str):
+                show(operands[-1])
+                shown += 1
+            elif operator == b"TJ" and operands and isinstance(operands[-1], list):
+                parts = []
+                for item in operands[-1]:
+                    if isinstance(item, str):
+                        parts.append(item)
+                    elif item <= _WORD_GAP:
+                        parts.append(" ")
+                show("".join(parts))
+                shown += 1
+            operands = []
+            if shown >= max_text_ops:
+                break
+        else:
+            number = float(token)
+            (array if array is not None else operands).append(number)
+    new_line()
+    return "\n".join(lines)
@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import hashlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Read from the working directory when present, like merger_stats.sqlite; DEFAULT_RULES apply otherwise.
+RULES_FILE = "extraction_rules.json"
+RULES_VERSION = 1
+# The export format the app was written for; also what extraction_rules.json contains.
+DEFAULT_RULES = {
+    "version": RULES_VERSION,
+    # Page type -> patterns for the document number in that type's header, one capture group each.
+    "page_types": {
+        "invoice": [r"Invoice #\s*(\d{4}-\d{3})"],
+        "affidavit": [r"Affidavit\s*(\d{4}-\d{3})"],
+    },
+    # The customer name is the line after the first line containing one of these...
+    "customer_anchors": ["Bill To"],
+    # ...on pages of these types; the scan of other pages ends at their document number.
+    "customer_page_types": ["invoice"],
+}
+UNKNOWN_CUSTOMER = "UNKNOWN"
+
+
+class PageFields(NamedTuple):
+    document_number: Optional[str]
+    page_type: Optional[str]
+    # None when the page has no customer anchor or is not of a customer page type, "" when the
+    # line after the anchor is blank.
+    customer: Optional[str]
+
+
+class ExtractionRules:
+    """
+    Document-number formats, page-type classifiers and customer-name anchors, compiled into one
+    regular expression so a page's text is scanned once for every field.
+
+    The first document-number match in the text decides the number and the page type, as the
+    single hard-coded pattern did before; the first anchor decides the customer.
+    """
+
+    def __init__(self, config: dict):
+        if config.get("version", RULES_VERSION) != RULES_VERSION:
+            raise ValueError(f"Unsupported extraction rules version {config.get('version')}")
+        alternatives: List[str] = []
+        # Group number -> (page type, or None for an anchor, group holding the value). A capture group
+        # around each alternative would stop re from skipping ahead to the possible first characters,
+        # which makes the scan several times slower, so each alternative is found by its own groups.
+        self._fields: Dict[int, Tuple[Optional[str], int]] = {}
+        group = 1
+        for page_type, patterns in config.get("page_types", {}).items():
+            for pattern in patterns:
+                compiled = self._compile(pattern, f"document-number pattern for {page_type!r}")
+                if compiled.groups != 1 or compiled.groupindex:
+                    raise ValueError(f"Document-number pattern {pattern!r} for {page_type!r} needs exactly one "
+                                     "unnamed capture group, around the number")
+                alternatives.append(f"(?:{pattern})")
+                self._fields[group] = (page_type, group)
+                group += 1
+        if not alternatives:
+            raise ValueError("Extraction rules define no document-number patterns")
+        for anchor in config.get("customer_anchors", []):
+            # An empty group marks which anchor matched when the customer line is blank. The rest is
+            # a lookahead, so the customer line can still hold other fields.
+            alternatives.append(rf"{re.escape(anchor)}()(?=[^\n]*\n(?:([^\n]+)|\n))")
+            self._fields[group] = self._fields[group + 1] = (None, group + 1)
+            group += 2
+        page_types = {page_type for page_type, _ in self._fields.values() if page_type}
+        self._customer_page_types = set(config.get("customer_page_types", page_types))
+        self.pattern = self._compile("|".join(alternatives), "combination of extraction rules")
+        key = f"{self.pattern.pattern}\n{sorted(self._customer_page_types)}"
+        self.key = hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    @property
+    def customer_page_types(self) -> frozenset:
+        return frozenset(self._customer_page_types)
+
+    @staticmethod
+    def _compile(pattern: str, what: str) -> re.Pattern:
+        try:
+            return re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid {what} {pattern!r}: {e}") from e
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "ExtractionRules":
+        """Rules from path, else from RULES_FILE in the working directory if there is one, else the defaults."""
+        if path is None:
+            if not os.path.exists(RULES_FILE):
+                return cls(DEFAULT_RULES)
+            path = RULES_FILE
+        try:
+            with open(path) as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Could not read extraction rules from {path}: {e}") from e
+        return cls(config)
+
+    def extract(self, text: str) -> PageFields:
+        document_number = page_type = customer = None
+        for match in self.pattern.finditer(text):
+            if match.lastindex is None:
+                # A pattern whose number group is optional matched without it.
+                continue
+            match_type, value_group = self._fields[match.lastindex]
+            if match_type is None:
+                if customer is None:
+                    customer = (match.group(value_group) or "").strip()
+            elif document_number is None:
+                document_number, page_type = match.group(value_group), match_type
+                if page_type not in self._customer_page_types:
+                    customer = None
+                    break
+            if document_number is not None and customer is not None:
+                break
+        return PageFields(document_number, page_type, customer)
+
+    def customer(self, text: str) -> str:
+        customer = self.extract(text).customer
+        return UNKNOWN_CUSTOMER if customer is None else customer
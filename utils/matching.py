@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import logging
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+MATCH_REPORT_FILENAME = "match_report.json"
+# Digits an OCR'd or retyped document number commonly confuses, in both directions.
+CONFUSABLE_DIGITS = {
+    '0': '689', '1': '7', '3': '8', '5': '6', '6': '058', '7': '1', '8': '036', '9': '0',
+}
+# Candidate scores; a shared customer name adds CUSTOMER_BONUS.
+SCORES = {'digit confusion': 0.8, 'transposed digits': 0.7, 'adjacent number': 0.4, 'same customer': 0.3}
+CUSTOMER_BONUS = 0.3
+MAX_CANDIDATES = 3
+
+
+def month_code(path: str) -> Optional[str]:
+    """The first four digits in a file name, e.g. "2501" (YYMM) in 2501_invoice_part2.pdf, or None."""
+    match = re.search(r'(\d{4})', os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def split_input_files(paths: Sequence[str]) -> Tuple[List[str], List[str]]:
+    """
+    Sort PDFs into invoice and affidavit files by name; other files are left out.
+
+    An export may be split into parts (by market, by station); every part is merged. Which
+    invoice goes with which affidavit is decided by document number, not by file name.
+    """
+    invoice_files = [path for path in paths if 'invoice' in os.path.basename(path).lower()]
+    affidavit_files = [path for path in paths if 'affidavit' in os.path.basename(path).lower()
+                       and 'invoice' not in os.path.basename(path).lower()]
+    return invoice_files, affidavit_files
+
+
+def near_miss_variants(doc_num: str) -> Iterator[Tuple[str, str]]:
+    """Yield (document number, reason) for the numbers doc_num is likely to have been mistaken for."""
+    year, _, number = doc_num.partition('-')
+    digits = list(year + number)
+    for i, digit in enumerate(digits):
+        for other in CONFUSABLE_DIGITS.get(digit, ''):
+            variant = digits[:i] + [other] + digits[i + 1:]
+            yield _format(variant, len(year)), 'digit confusion'
+    for i in range(len(digits) - 1):
+        if digits[i] != digits[i + 1]:
+            variant = digits[:i] + [digits[i + 1], digits[i]] + digits[i + 2:]
+            yield _format(variant, len(year)), 'transposed digits'
+    if number.isdigit():
+        for step in (-1, 1):
+            if 0 < int(number) + step < 10 ** len(number):
+                yield f"{year}-{int(number) + step:0{len(number)}d}", 'adjacent number'
+
+
+def _format(digits: List[str], year_length: int) -> str:
+    return "".join(digits[:year_length]) + "-" + "".join(digits[year_length:])
+
+
+def _known(customer: Optional[str]) -> Optional[str]:
+    return customer if customer and customer != "UNKNOWN" else None
+
+
+def find_candidates(orphans: Dict[str, Optional[str]],
+                    others: Dict[str, Optional[str]]) -> Dict[str, List[dict]]:
+    """
+    Suggest documents from others (document number -> customer) for each orphan.
+
+    Every orphan only looks up its own few dozen variants and its customer name in hash indexes
+    of the other side, so the search is linear in the number of orphans.
+    """
+    by_customer = defaultdict(list)
+    for doc_num, customer in others.items():
+        if _known(customer):
+            by_customer[customer.casefold()].append(doc_num)
+    candidates = {}
+    for doc_num, customer in orphans.items():
+        found: Dict[str, dict] = {}
+        for variant, reason in near_miss_variants(doc_num):
+            if variant in others and variant not in found:
+                found[variant] = {'document': variant, 'reason': reason, 'score': SCORES[reason]}
+        if _known(customer):
+            for other in by_customer.get(customer.casefold(), ()):
+                if other in found:
+                    found[other]['reason'] += ', same customer'
+                    found[other]['score'] = min(1.0, found[other]['score'] + CUSTOMER_BONUS)
+                else:
+                    found[other] = {'document': other, 'reason': 'same customer', 'score': SCORES['same customer']}
+        if found:
+            ranked = sorted(found.values(), key=lambda candidate: (-candidate['score'], candidate['document']))
+            candidates[doc_num] = [dict(candidate, score=round(candidate['score'], 2))
+                                   for candidate in ranked[:MAX_CANDIDATES]]
+    return candidates
+
+
+def _page_range(page_indices: List[int]) -> List[int]:
+    return [page_indices[0] + 1, page_indices[-1] + 1]
+
+
+def build_match_report(invoice_runs: Dict[str, List[int]], affidavit_runs: Dict[str, List[int]],
+                       customers: Dict[str, Optional[str]],
+                       duplicates: Optional[Dict[str, List[str]]] = None,
+                       files: Optional[Dict[str, Dict[str, str]]] = None) -> dict:
+    """
+    Describe how the documents of one month pair up.
+
+    invoice_runs and affidavit_runs map document numbers to page indices; customers maps
+    document numbers to customer names where known. Page ranges in the report are 1-based.
+    files maps 'invoice' and 'affidavit' to the file each document was found in, for exports
+    split into several parts.
+    """
+    files = files or {'invoice': {}, 'affidavit': {}}
+    matched = [doc_num for doc_num in invoice_runs if doc_num in affidavit_runs]
+    missing_affidavits = sorted(set(invoice_runs) - set(affidavit_runs))
+    missing_invoices = sorted(set(affidavit_runs) - set(invoice_runs))
+    invoice_orphans = {doc_num: customers.get(doc_num) for doc_num in missing_affidavits}
+    affidavit_orphans = {doc_num: customers.get(doc_num) for doc_num in missing_invoices}
+    invoice_candidates = find_candidates(invoice_orphans, affidavit_orphans)
+    affidavit_candidates = find_candidates(affidavit_orphans, invoice_orphans)
+
+    def orphan(doc_num: str, side: str, runs: Dict[str, List[int]], candidates: Dict[str, List[dict]]) -> dict:
+        return {'document': doc_num, 'file': files[side].get(doc_num), 'pages': _page_range(runs[doc_num]),
+                'customer': _known(customers.get(doc_num)), 'candidates': candidates.get(doc_num, [])}
+
+    return {
+        'counts': {'invoices': len(invoice_runs), 'affidavits': len(affidavit_runs), 'matched': len(matched),
+                   'missing_affidavits': len(missing_affidavits), 'missing_invoices': len(missing_invoices)},
+        'matched': [{'document': doc_num, 'customer': _known(customers.get(doc_num)),
+                     'invoice_file': files['invoice'].get(doc_num),
+                     'invoice_pages': _page_range(invoice_runs[doc_num]),
+                     'affidavit_file': files['affidavit'].get(doc_num),
+                     'affidavit_pages': _page_range(affidavit_runs[doc_num])} for doc_num in matched],
+        'missing_affidavits': [orphan(doc_num, 'invoice', invoice_runs, invoice_candidates)
+                               for doc_num in missing_affidavits],
+        'missing_invoices': [orphan(doc_num, 'affidavit', affidavit_runs, affidavit_candidates)
+                             for doc_num in missing_invoices],
+        'duplicates': duplicates or {},
+    }
+
+
+def suggestion_lines(report: dict) -> List[str]:
+    """
+    One line per orphan with a likely partner, best scores first. Each document is suggested at
+    most once, so two orphan invoices never point at the same affidavit.
+    """
+    orphans = [('Invoice', 'affidavit', entry) for entry in report['missing_affidavits']]
+    orphans += [('Affidavit', 'invoice', entry) for entry in report['missing_invoices']]
+    orphans.sort(key=lambda item: -item[2]['candidates'][0]['score'] if item[2]['candidates'] else 0)
+    lines, used = [], set()
+    for kind, other_kind, entry in orphans:
+        if entry['document'] in used:
+            continue
+        best = next((candidate for candidate in entry['candidates'] if candidate['document'] not in used), None)
+        if best:
+            used.update((entry['document'], best['document']))
+            lines.append(f"{kind} {entry['document']} may belong with {other_kind} {best['document']} ({best['reason']})")
+    return lines
+
+
+def write_match_report(report: dict, output_dir: str) -> str:
+    path = os.path.join(output_dir, MATCH_REPORT_FILENAME)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+    logging.info(f"Match report written to {path}")
+    return path
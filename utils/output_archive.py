@@ -0,0 +1,108 @@
+import os
+import logging
+import tempfile
+import zipfile
+from typing import Optional
+
+from PyPDF2._writer import PdfWriter  # force direct import
+
+from utils.pdf_optimizer import compress_page_contents, deduplicate_streams
+
+# "files" writes one PDF per document; the others put every document into a single file.
+OUTPUT_FORMATS = ("files", "zip", "pdf")
+# Merged PDFs are mostly compressed already, so a fast level gives nearly all of the size reduction.
+ZIP_COMPRESSLEVEL = 1
+
+
+def archive_filename(output_format: str, name: str) -> Optional[str]:
+    """File name of the single output for output_format, or None when each document gets its own file."""
+    return None if output_format == "files" else f"{name}_merged.{output_format}"
+
+
+class _SingleFileOutput:
+    """Written under a temporary name and renamed into place on close, so it is either complete or absent."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.saved = 0
+        fd, self._temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".part",
+                                               dir=os.path.dirname(os.path.abspath(path)))
+        self._file = os.fdopen(fd, 'wb')
+
+    def _finish(self):
+        pass
+
+    def close(self, keep: bool = True) -> Optional[str]:
+        """Finish the file and rename it into place, or throw it away; returns the path if it was kept."""
+        try:
+            if keep:
+                self._finish()
+                self.size = self._file.tell()
+        except BaseException:
+            keep = False
+            raise
+        finally:
+            self._file.close()
+            if not keep:
+                os.remove(self._temp_path)
+        if not keep:
+            return None
+        os.replace(self._temp_path, self.path)
+        logging.info(f"Wrote {self.path} ({self.size} bytes)")
+        return self.path
+
+
+class ZipOutput(_SingleFileOutput):
+    """Merged documents streamed into one ZIP as they are produced, without a file per document on disk."""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._zip = zipfile.ZipFile(self._file, 'w', compression=zipfile.ZIP_DEFLATED,
+                                    compresslevel=ZIP_COMPRESSLEVEL)
+
+    def add(self, name: str, data: bytes):
+        self._zip.writestr(name, data)
+
+    def close(self, keep: bool = True) -> Optional[str]:
+        # Writes the central directory; harmless when the file is about to be thrown away.
+        try:
+            self._zip.close()
+        except BaseException:
+            super().close(keep=False)
+            raise
+        return super().close(keep)
+
+
+class CombinedPdfOutput(_SingleFileOutput):
+    """
+    One PDF holding every merged document, with a bookmark at the first page of each.
+
+    PyPDF2 can only write a document as a whole, so the pages are collected in writer and the
+    file is written once, on close. Resources shared by several documents are stored once.
+    """
+
+    def __init__(self, path: str, optimize_output: bool = False, compress_content: bool = False):
+        super().__init__(path)
+        self.writer = PdfWriter()
+        self.optimize_output = optimize_output
+        self.compress_content = compress_content
+
+    def add_bookmark(self, title: str, first_page: int):
+        self.writer.add_outline_item(title, first_page)
+
+    def _finish(self):
+        if self.optimize_output:
+            _, self.saved = deduplicate_streams(self.writer)
+        if self.compress_content:
+            compress_page_contents(self.writer)
+        self.writer.write(self._file)
+
+
+def open_output(output_format: str, path: str, optimize_output: bool = False,
+                compress_content: bool = False) -> Optional[_SingleFileOutput]:
+    if output_format == "zip":
+        return ZipOutput(path)
+    if output_format == "pdf":
+        return CombinedPdfOutput(path, optimize_output, compress_content)
+    return None
@@ -0,0 +1,125 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, Set, Tuple
+
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+MANIFEST_FILENAME = ".merge_manifest.sqlite"
+# Bump when the source key changes meaning; older manifests are then discarded.
+MANIFEST_VERSION = 2
+
+
+def _object_hash(obj, memo: Dict[Tuple[int, int], bytes], active: Set[Tuple[int, int]]) -> bytes:
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in memo:
+            return memo[ref]
+        if ref in active:
+            # A reference back up the graph, e.g. an annotation's /P to its page.
+            return b"cycle"
+        active.add(ref)
+        memo[ref] = _object_hash(obj.get_object(), memo, active)
+        active.discard(ref)
+        return memo[ref]
+    # Kinds rather than class names: reading page.mediabox, say, turns the array into a RectangleObject.
+    if isinstance(obj, DictionaryObject):
+        digest = hashlib.sha1(b"stream" if isinstance(obj, StreamObject) else b"dict")
+        for name in sorted(obj):
+            # The parent is the page tree, i.e. every other page; inherited attributes are already
+            # copied onto the page when the reader flattens it.
+            if name != "/Parent":
+                digest.update(name.encode())
+                digest.update(_object_hash(obj.raw_get(name), memo, active))
+        if isinstance(obj, StreamObject):
+            data = getattr(obj, '_data', b"")
+            digest.update(data if isinstance(data, bytes) else str(data).encode())
+    elif isinstance(obj, ArrayObject):
+        digest = hashlib.sha1(b"array")
+        for item in obj:
+            digest.update(_object_hash(item, memo, active))
+    else:
+        digest = hashlib.sha1(repr(obj).encode())
+    return digest.digest()
+
+
+def page_content_hash(page) -> str:
+    """
+    Hash everything a page brings into a merged document: its dictionary and every object it
+    references, e.g. content streams, fonts, images and form XObjects.
+    """
+    return _object_hash(page, {}, set()).hex()
+
+
+def source_key(page_hashes: Iterable[str], options: str) -> str:
+    """Identify a merged document by the content hashes of its source pages, in order, and the output options."""
+    digest = hashlib.sha1(options.encode())
+    for page_hash in page_hashes:
+        digest.update(page_hash.encode())
+    return digest.hexdigest()
+
+
+class OutputManifest:
+    """
+    Record of the merged documents in an output directory and the source pages each was built from.
+
+    A row is committed as soon as its document has been renamed into place, so an interrupted run
+    loses at most the documents that were still being written. A document is up to date when its
+    source key is unchanged and the recorded file is still there with the recorded size.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != MANIFEST_VERSION:
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS outputs;"
+                f"PRAGMA user_version={MANIFEST_VERSION};"
+            )
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outputs (
+                doc_num TEXT PRIMARY KEY,
+                source_key TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                written REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def is_current(self, doc_num: str, key: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source_key, filename, size FROM outputs WHERE doc_num = ?", (doc_num,)
+            ).fetchone()
+        if row is None or row[0] != key:
+            return False
+        path = os.path.join(self.output_dir, row[1])
+        return os.path.isfile(path) and os.path.getsize(path) == row[2]
+
+    def record(self, doc_num: str, key: str, output_filename: str, size: int):
+        filename = os.path.basename(output_filename)
+        with self._lock:
+            row = self._conn.execute("SELECT filename FROM outputs WHERE doc_num = ?", (doc_num,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs (doc_num, source_key, filename, size, written) VALUES (?, ?, ?, ?, ?)",
+                (doc_num, key, filename, size, time.time()),
+            )
+            self._conn.commit()
+        # A changed customer name renames the output; the file under the old name is stale.
+        if row is not None and row[0] != filename:
+            stale = os.path.join(self.output_dir, row[0])
+            if os.path.isfile(stale):
+                os.remove(stale)
+                logging.info(f"Removed {row[0]}; document {doc_num} is now {filename}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
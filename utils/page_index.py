@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PyPDF2.generic import ArrayObject, IndirectObject
+
+INDEX_FILENAME = ".page_index.sqlite"
+# Bump when the fingerprint, the stored fields or what detection finds change; older indexes are then discarded.
+INDEX_VERSION = 3
+DEFAULT_MAX_PAGES = 500_000
+_HASH_CHUNK = 1024 * 1024
+_LOOKUP_BATCH = 500
+
+
+def file_fingerprint(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stream_bytes(stream) -> bytes:
+    # The still-encoded bytes: hashing them avoids inflating the stream.
+    data = getattr(stream, '_data', b"")
+    return data if isinstance(data, bytes) else str(data).encode()
+
+
+def _hash_resources(digest, resources, seen: set):
+    """Fonts and form XObjects, recursively: extract_text() also reads the text drawn inside forms."""
+    if resources is None:
+        return
+    resources = resources.get_object()
+    fonts = resources.get("/Font")
+    if fonts is not None:
+        for name, font_ref in sorted(fonts.get_object().items()):
+            font = font_ref.get_object()
+            digest.update(f"{name}{font.get('/BaseFont')}{font.get('/Subtype')}{font.get('/Encoding')}".encode())
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    for name, xobject_ref in sorted(xobjects.get_object().items()):
+        xobject = xobject_ref.get_object()
+        if xobject.get("/Subtype") != "/Form":
+            # Images carry no text.
+            continue
+        digest.update(f"{name}{xobject.get('/Matrix')}".encode())
+        # A form drawn from several places, or from itself, is hashed once.
+        key = (xobject_ref.idnum, xobject_ref.generation) if isinstance(xobject_ref, IndirectObject) else None
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        digest.update(_stream_bytes(xobject))
+        _hash_resources(digest, xobject.get("/Resources"), seen)
+
+
+def page_fingerprint(page) -> str:
+    """
+    Hash what detection depends on: the raw content stream bytes, the fonts and the page box,
+    and the same for every form XObject the page draws.
+    """
+    digest = hashlib.sha1()
+    contents = page.get_contents()
+    if contents is not None:
+        parts = contents if isinstance(contents, ArrayObject) else [contents]
+        for part in parts:
+            digest.update(_stream_bytes(part.get_object()))
+    _hash_resources(digest, page.get("/Resources"), set())
+    digest.update(str(list(page.mediabox)).encode())
+    return digest.hexdigest()
+
+
+class PageIndex:
+    """
+    On-disk cache of per-page detection results, stored in the output directory.
+
+    A file whose content hash is known maps straight to its page fingerprints, so nothing is read
+    from the PDF. A changed file is fingerprinted page by page and only unknown pages are
+    extracted again. Results are keyed by detector_key, so changing the detection mode or pattern
+    never reuses stale results. The pages table is capped at max_pages rows, least recently used
+    first out.
+    """
+
+    def __init__(self, output_dir: str, detector_key: str, max_pages: int = DEFAULT_MAX_PAGES):
+        self.path = os.path.join(output_dir, INDEX_FILENAME)
+        self.detector_key = detector_key
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            self._conn.executescript(
+                "DROP TABLE IF EXISTS files;"
+                "DROP TABLE IF EXISTS pages;"
+                f"PRAGMA user_version={INDEX_VERSION};"
+            )
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                file_hash TEXT NOT NULL,
+                detector_key TEXT NOT NULL,
+                page_hashes TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (file_hash, detector_key)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                page_hash TEXT NOT NULL,
+                detector_key TEXT NOT NULL,
+                doc_num TEXT,
+                customer TEXT,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (page_hash, detector_key)
+            );
+            CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used);
+            CREATE INDEX IF NOT EXISTS files_last_used ON files (last_used);
+        """)
+        self._conn.commit()
+
+    def file_pages(self, file_hash: str) -> Optional[List[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT page_hashes FROM files WHERE file_hash = ? AND detector_key = ?",
+                (file_hash, self.detector_key),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE files SET last_used = ? WHERE file_hash = ? AND detector_key = ?",
+                (time.time(), file_hash, self.detector_key),
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def lookup(self, page_hashes: Iterable[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """Return {page hash: (document number, customer)} for the known pages."""
+        unique = list(dict.fromkeys(page_hashes))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(unique), _LOOKUP_BATCH):
+                batch = unique[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT page_hash, doc_num, customer FROM pages "
+                    f"WHERE detector_key = ? AND page_hash IN ({placeholders})",
+                    [self.detector_key, *batch],
+                ).fetchall()
+                for page_hash, doc_num, customer in rows:
+                    found[page_hash] = (doc_num, customer)
+                self._conn.execute(
+                    f"UPDATE pages SET last_used = ? WHERE detector_key = ? AND page_hash IN ({placeholders})",
+                    [now, self.detector_key, *batch],
+                )
+            self._conn.commit()
+        return found
+
+    def store_file(self, file_hash: str, page_hashes: List[str], doc_numbers: Dict[str, Optional[str]]):
+        """Record a fully scanned file: its page fingerprints and each page's document number."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_hash, detector_key, page_hashes, last_used) VALUES (?, ?, ?, ?)",
+                (file_hash, self.detector_key, json.dumps(page_hashes), now),
+            )
+            # Keep a customer name found by an earlier run for the same page.
+            self._conn.executemany(
+                "INSERT INTO pages (page_hash, detector_key, doc_num, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (page_hash, detector_key) DO UPDATE SET doc_num = excluded.doc_num, "
+                "last_used = excluded.last_used",
+                [(page_hash, self.detector_key, doc_num, now) for page_hash, doc_num in doc_numbers.items()],
+            )
+            self._conn.commit()
+        self._evict()
+
+    def store_customer(self, page_hash: str, customer: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET customer = ? WHERE page_hash = ? AND detector_key = ?",
+                (customer, page_hash, self.detector_key),
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        with self._lock:
+            excess = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - self.max_pages
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM pages WHERE rowid IN (SELECT rowid FROM pages ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                # A file entry is only useful while its pages are indexed; drop the stalest ones with them.
+                self._conn.execute(
+                    "DELETE FROM files WHERE last_used < (SELECT COALESCE(MIN(last_used), 0) FROM pages)"
+                )
+                self._conn.commit()
+                logging.info(f"Page index over its {self.max_pages}-page cap; evicted {excess} pages.")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
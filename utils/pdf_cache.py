@@ -0,0 +1,127 @@
+import io
+import os
+import mmap
+import time
+import logging
+import threading
+from collections import OrderedDict
+from PyPDF2 import PageObject, PdfReader
+from PyPDF2.generic import NameObject
+
+# Parsed documents kept per process. Each holds the whole file, so keep the count small.
+MAX_CACHED_DOCUMENTS = 8
+# Page attributes a page takes from its ancestors in the page tree when it has none of its own.
+INHERITABLE_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+class PdfHandle:
+    """A parsed PDF shared by validation, scanning and merging for as long as the file is unchanged."""
+
+    def __init__(self, path: str, size: int, mtime_ns: int, use_mmap: bool = False, low_memory: bool = False):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.hits = 0
+        self.opened_at = time.time()
+        # PdfReader seeks a single stream, so threads sharing a handle must hold this while reading pages.
+        self.lock = threading.RLock()
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            if (use_mmap or low_memory) and size:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._buffer = io.BytesIO(f.read())
+        self.reader = PdfReader(self._buffer)
+        if low_memory:
+            # Keep only a reference per page; page() builds a throwaway page object on each call.
+            self._page_refs = []
+            self._collect_page_refs(self.reader.trailer["/Root"]["/Pages"], {})
+            self.reader.resolved_objects.clear()
+            self.page_count = len(self._page_refs)
+        else:
+            # Walk the page tree now so every later user gets it for free.
+            self._page_refs = None
+            self.page_count = len(self.reader.pages)
+        self.parse_time = time.perf_counter() - start
+        logging.info(f"Parsed {os.path.basename(path)} ({self.page_count} pages, {size} bytes) "
+                     f"in {self.parse_time:.3f}s")
+
+    def _collect_page_refs(self, node, inherited: dict):
+        node = node.get_object()
+        inherited = dict(inherited, **{attribute: node[attribute] for attribute in INHERITABLE_PAGE_ATTRIBUTES
+                                       if attribute in node})
+        for kid in node["/Kids"]:
+            is_node = kid.get_object().get("/Type") == "/Pages"
+            # Only the type was needed; don't let the walk resolve every page of the file at once.
+            self.reader.resolved_objects.pop((kid.generation, kid.idnum), None)
+            if is_node:
+                self._collect_page_refs(kid, inherited)
+            else:
+                # Siblings share one dict, so this costs memory per page-tree node, not per page.
+                self._page_refs.append((kid, inherited))
+
+    def page(self, index: int) -> PageObject:
+        """Page index of the file, with the attributes it inherits filled in as PdfReader.pages does."""
+        if self._page_refs is None:
+            return self.reader.pages[index]
+        ref, inherited = self._page_refs[index]
+        page = PageObject(self.reader, ref)
+        page.update(ref.get_object())
+        for attribute, value in inherited.items():
+            if attribute not in page:
+                page[NameObject(attribute)] = value
+        return page
+
+    def matches(self, size: int, mtime_ns: int) -> bool:
+        return self.size == size and self.mtime_ns == mtime_ns
+
+
+_handles: "OrderedDict[str, PdfHandle]" = OrderedDict()
+_handles_lock = threading.Lock()
+
+
+def open_pdf(pdf_path: str, use_mmap: bool = False, low_memory: bool = False) -> PdfHandle:
+    """
+    Return the cached handle for pdf_path, parsing the file only if it is new or has changed.
+
+    A low_memory handle is memory-mapped and holds no parsed pages: only the cross-reference
+    table and one reference per page stay in memory, whatever the size of the file.
+    """
+    path = os.path.abspath(pdf_path)
+    stat = os.stat(path)
+    with _handles_lock:
+        handle = _handles.get(path)
+        if handle is not None and handle.matches(stat.st_size, stat.st_mtime_ns) and (
+                handle._page_refs is not None or not low_memory):
+            handle.hits += 1
+            _handles.move_to_end(path)
+            return handle
+        handle = PdfHandle(path, stat.st_size, stat.st_mtime_ns, use_mmap, low_memory)
+        _handles[path] = handle
+        while len(_handles) > MAX_CACHED_DOCUMENTS:
+            # Not closed here: a running job may still hold the evicted handle; the buffer is freed with it.
+            _handles.popitem(last=False)
+        return handle
+
+
+def log_parse_summary(pdf_paths):
+    """Log how often each file was served from the cache instead of being parsed again."""
+    for pdf_path in pdf_paths:
+        handle = _handles.get(os.path.abspath(pdf_path))
+        if handle is not None:
+            logging.info(f"{os.path.basename(pdf_path)}: parsed once in {handle.parse_time:.3f}s, "
+                         f"reused {handle.hits} times (~{handle.parse_time * handle.hits:.3f}s of parsing saved)")
+
+
+def close_pdf(pdf_path: str):
+    """Drop pdf_path from the cache and release its buffer, so a memory-mapped file is unmapped straight away."""
+    with _handles_lock:
+        handle = _handles.pop(os.path.abspath(pdf_path), None)
+    if handle is not None:
+        handle.reader.resolved_objects.clear()
+        handle._buffer.close()
+
+
+def clear_cache():
+    with _handles_lock:
+        _handles.clear()
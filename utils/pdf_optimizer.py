@@ -0,0 +1,75 @@
+import hashlib
+from typing import Dict, Tuple
+
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NullObject, StreamObject
+
+# Duplicates can hide behind other duplicates (an image whose /SMask is itself a copy), so repeat
+# until a pass finds nothing, within reason.
+MAX_DEDUP_PASSES = 4
+
+
+def _stream_data(stream: StreamObject) -> bytes:
+    data = stream._data
+    return data.encode("latin-1") if isinstance(data, str) else data
+
+
+def _stream_key(stream: StreamObject) -> Tuple[str, Tuple]:
+    attributes = tuple(sorted((key, repr(value)) for key, value in stream.items() if key != "/Length"))
+    return hashlib.sha256(_stream_data(stream)).hexdigest(), attributes
+
+
+def _remap_references(obj, replacements: Dict[int, IndirectObject], writer: PdfWriter):
+    if isinstance(obj, DictionaryObject):
+        items = obj.items()
+    elif isinstance(obj, ArrayObject):
+        items = enumerate(obj)
+    else:
+        return
+    for key, value in list(items):
+        if isinstance(value, IndirectObject):
+            # References still pointing into a source reader share the number space; leave them alone.
+            if value.pdf is writer and value.idnum in replacements:
+                obj[key] = replacements[value.idnum]
+        else:
+            _remap_references(value, replacements, writer)
+
+
+def deduplicate_streams(writer: PdfWriter) -> Tuple[int, int]:
+    """
+    Point every reference to an identical stream (fonts, images, form XObjects) at one copy.
+
+    Duplicates are replaced by null objects rather than removed, because PdfWriter numbers
+    objects by position. Returns (streams removed, stream bytes saved).
+    """
+    removed = saved = 0
+    objects = writer._objects
+    for _ in range(MAX_DEDUP_PASSES):
+        canonical: Dict[Tuple[str, Tuple], IndirectObject] = {}
+        replacements: Dict[int, IndirectObject] = {}
+        for position, obj in enumerate(objects):
+            if not isinstance(obj, StreamObject):
+                continue
+            key = _stream_key(obj)
+            if key in canonical:
+                replacements[position + 1] = canonical[key]
+                saved += len(_stream_data(obj))
+            else:
+                canonical[key] = IndirectObject(position + 1, 0, writer)
+        if not replacements:
+            break
+        for idnum in replacements:
+            objects[idnum - 1] = NullObject()
+        for obj in objects:
+            _remap_references(obj, replacements, writer)
+        removed += len(replacements)
+    return removed, saved
+
+
+def compress_page_contents(writer: PdfWriter):
+    """Flate-encode every page's content stream that is not compressed already."""
+    for page in writer.pages:
+        contents = page.get_contents()
+        if isinstance(contents, StreamObject) and contents.get("/Filter") is not None:
+            continue
+        page.compress_content_streams()
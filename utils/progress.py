@@ -0,0 +1,120 @@
+import time
+import logging
+import threading
+from typing import Callable, Optional
+
+# Minimum seconds between two progress events; stage changes are always reported.
+PROGRESS_INTERVAL = 0.25
+
+
+class ProgressReporter:
+    """
+    Counts the work done by a run and hands a snapshot to callback at most every interval seconds.
+
+    Scanning and writing are weighted equally: a run is half done when every page has been
+    scanned, and done when every matched page has been written. The callback runs on whichever
+    thread did the work, so a GUI should only queue the event. Without a callback, counting is a
+    single comparison.
+    """
+
+    def __init__(self, callback: Optional[Callable[[dict], None]] = None, interval: float = PROGRESS_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.stage = "starting"
+        self.pages_total = 0
+        self.pages_scanned = 0
+        self.documents_matched = 0
+        self.pages_to_write = 0
+        self.pages_written = 0
+        self.files_written = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_emit = 0.0
+
+    def start(self, pages_total: int):
+        with self._lock:
+            self.pages_total = pages_total
+            self._start = time.perf_counter()
+        self.set_stage("scanning")
+
+    def set_stage(self, stage: str, pages_to_write: Optional[int] = None):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.stage = stage
+            if pages_to_write is not None:
+                self.pages_to_write = pages_to_write
+            event = self._snapshot(time.perf_counter())
+        self._emit(event)
+
+    def pages(self, count: int = 1):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.pages_scanned += count
+            event = self._due()
+        if event:
+            self._emit(event)
+
+    def matched(self):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.documents_matched += 1
+            event = self._due()
+        if event:
+            self._emit(event)
+
+    def written(self, pages: int, size: int):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.files_written += 1
+            self.pages_written += pages
+            self.bytes_written += size
+            event = self._due()
+        if event:
+            self._emit(event)
+
+    def _due(self) -> Optional[dict]:
+        now = time.perf_counter()
+        if now - self._last_emit < self.interval:
+            return None
+        return self._snapshot(now)
+
+    def _snapshot(self, now: float) -> dict:
+        self._last_emit = now
+        elapsed = now - self._start
+        fraction = None
+        if self.stage == "done":
+            fraction = 1.0
+        elif self.pages_total:
+            # Until scanning ends the matched pages are unknown; assume every page will be written.
+            to_write = self.pages_to_write if self.stage == "merging" else self.pages_total
+            scanned = min(self.pages_scanned, self.pages_total) / self.pages_total
+            written = self.pages_written / to_write if to_write else 1.0
+            fraction = min(1.0, (scanned + written) / 2)
+        eta = None
+        if fraction and fraction < 1.0 and elapsed > 0:
+            eta = round(elapsed * (1 - fraction) / fraction, 1)
+        return {
+            'stage': self.stage,
+            'pages_scanned': self.pages_scanned,
+            'pages_total': self.pages_total,
+            'documents_matched': self.documents_matched,
+            'files_written': self.files_written,
+            'pages_written': self.pages_written,
+            'bytes_written': self.bytes_written,
+            'elapsed': round(elapsed, 2),
+            'pages_per_sec': round((self.pages_scanned + self.pages_written) / elapsed, 1) if elapsed else 0.0,
+            'fraction': fraction,
+            'eta_seconds': eta,
+        }
+
+    def _emit(self, event: dict):
+        try:
+            self.callback(event)
+        except Exception as e:
+            # Progress display must never abort the run it reports on.
+            logging.warning(f"Progress callback failed: {e}")
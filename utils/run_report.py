@@ -0,0 +1,166 @@
+import os
+import io
+import json
+import time
+import pstats
+import logging
+import cProfile
+import platform
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+REPORT_FILENAME = "run_report.json"
+PROFILE_FILENAME = "run_profile.prof"
+PROFILE_MODES = ("cprofile", "tracemalloc")
+# Entries listed by name in the report's slowest-pages, slowest-documents and profile sections.
+TOP_ENTRIES = 10
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    if not ordered:
+        return {'count': 0, 'total': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+
+    def percentile(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 6)
+
+    return {'count': len(ordered), 'total': round(sum(ordered), 4), 'p50': percentile(0.5),
+            'p95': percentile(0.95), 'max': round(ordered[-1], 6)}
+
+
+class RunReport:
+    """
+    Timings, byte counts and an optional profile for one processing run.
+
+    Stage times accumulate across threads. Page and document timings keep every sample, so the
+    report can give percentiles and name the slowest ones. profile is None, "cprofile" (every
+    thread that enters profiled()) or "tracemalloc" (peak Python memory and top allocation sites).
+    """
+
+    def __init__(self, profile: Optional[str] = None):
+        if profile not in (None, *PROFILE_MODES):
+            raise ValueError(f"Unknown profile mode {profile!r}; expected one of {', '.join(PROFILE_MODES)}")
+        self.profile = profile
+        self.started = time.time()
+        self.stages: Dict[str, float] = {}
+        self.files: Dict[str, dict] = {}
+        self.page_times: List[tuple] = []
+        self.pages_from_index = 0
+        self.document_times: List[tuple] = []
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+        self._profilers: List[cProfile.Profile] = []
+        self._tracing = False
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self.profile == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_bytes_read(self, count: int):
+        with self._lock:
+            self.bytes_read += count
+
+    def add_file(self, path: str, **details):
+        self.files.setdefault(os.path.basename(path), {}).update(details)
+
+    def add_page_times(self, path: str, timings):
+        """Record (page index, seconds) pairs for pages whose document number was extracted."""
+        name = os.path.basename(path)
+        self.page_times.extend((name, index, seconds) for index, seconds in timings)
+
+    def add_document(self, doc_num: str, seconds: float, size: int):
+        self.document_times.append((doc_num, seconds, size))
+
+    @contextmanager
+    def profiled(self):
+        """Profile the calling thread for the duration of the block when cProfile is enabled."""
+        if self.profile != "cprofile":
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler already owns this thread (or, on newer Pythons, the interpreter).
+            yield
+            return
+        with self._lock:
+            self._profilers.append(profiler)
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    def _profile_section(self, output_dir: str) -> Optional[dict]:
+        if self.profile == "tracemalloc":
+            if not tracemalloc.is_tracing():
+                return None
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ENTRIES]
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+            return {'mode': 'tracemalloc', 'peak_bytes': peak, 'current_bytes': current,
+                    'top_allocations': [str(stat) for stat in top]}
+        if self.profile == "cprofile" and self._profilers:
+            stats = pstats.Stats(self._profilers[0])
+            for profiler in self._profilers[1:]:
+                stats.add(profiler)
+            profile_path = os.path.join(output_dir, PROFILE_FILENAME)
+            stats.dump_stats(profile_path)
+            text = io.StringIO()
+            pstats.Stats(profile_path, stream=text).sort_stats("cumulative").print_stats(TOP_ENTRIES * 2)
+            return {'mode': 'cprofile', 'file': PROFILE_FILENAME, 'threads': len(self._profilers),
+                    'top_functions': [line for line in text.getvalue().splitlines() if line.strip()]}
+        return None
+
+    def write(self, output_dir: str, status: str, stats: dict, settings: dict,
+              error: Optional[str] = None) -> str:
+        """Write the report as REPORT_FILENAME in output_dir and return its path."""
+        total = time.perf_counter() - self._start if self._start is not None else 0.0
+        slowest_pages = sorted(self.page_times, key=lambda item: item[2], reverse=True)[:TOP_ENTRIES]
+        slowest_documents = sorted(self.document_times, key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]
+        report = {
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'seconds': round(total, 3),
+            'status': status,
+            'error': error,
+            'python': platform.python_version(),
+            'settings': settings,
+            'input_files': self.files,
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            'pages': dict(_distribution([seconds for _, _, seconds in self.page_times]),
+                          from_index=self.pages_from_index,
+                          slowest=[{'file': name, 'page': index + 1, 'seconds': round(seconds, 6)}
+                                   for name, index, seconds in slowest_pages]),
+            'documents': dict(_distribution([seconds for _, seconds, _ in self.document_times]),
+                              slowest=[{'document': doc_num, 'seconds': round(seconds, 6), 'bytes': size}
+                                       for doc_num, seconds, size in slowest_documents]),
+            'bytes_read': self.bytes_read,
+            'bytes_written': stats.get('bytes_written', 0),
+            'results': stats,
+            'profile': self._profile_section(output_dir),
+        }
+        path = os.path.join(output_dir, REPORT_FILENAME)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=4)
+        logging.info(f"Run report written to {path}")
+        return path
@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+STATS_FILE = "merger_stats.sqlite"
+# Daily totals from before the run log; imported once when the database is created.
+LEGACY_STATS_FILE = "merger_stats.json"
+STATS_VERSION = 1
+
+
+class StatsTracker:
+    """
+    Append-only log of processing runs with per-day totals, shared by the GUI, the CLI and watch mode.
+
+    Each run is one inserted row. Its day's totals are updated in the same transaction, so
+    get_today_stats reads a single row however many runs there have been. SQLite in WAL mode
+    serialises writers from any number of processes; readers never wait for them.
+    """
+
+    def __init__(self, stats_file: str = STATS_FILE, legacy_file: Optional[str] = LEGACY_STATS_FILE):
+        self.stats_file = stats_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(stats_file, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        new = self._conn.execute("PRAGMA user_version").fetchone()[0] != STATS_VERSION
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                day TEXT NOT NULL,
+                finished REAL NOT NULL,
+                source TEXT NOT NULL,
+                input_dir TEXT,
+                status TEXT NOT NULL,
+                seconds REAL NOT NULL,
+                pages INTEGER NOT NULL,
+                documents INTEGER NOT NULL,
+                skipped INTEGER NOT NULL,
+                invoices INTEGER NOT NULL,
+                affidavits INTEGER NOT NULL,
+                bytes_written INTEGER NOT NULL,
+                bytes_saved INTEGER NOT NULL,
+                stages TEXT,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS daily (
+                day TEXT PRIMARY KEY,
+                run_count INTEGER NOT NULL DEFAULT 0,
+                error_count INTEGER NOT NULL DEFAULT 0,
+                total_time REAL NOT NULL DEFAULT 0,
+                pages INTEGER NOT NULL DEFAULT 0,
+                documents INTEGER NOT NULL DEFAULT 0,
+                bytes_written INTEGER NOT NULL DEFAULT 0,
+                total_invoice_balance REAL NOT NULL DEFAULT 0
+            );
+            PRAGMA user_version={STATS_VERSION};
+        """)
+        self._conn.commit()
+        if new and legacy_file and os.path.exists(legacy_file):
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file: str):
+        try:
+            with open(legacy_file) as f:
+                content = f.read().strip()
+            legacy = json.loads(content) if content else {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not import {legacy_file}: {e}")
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO daily (day, run_count, error_count, total_time, total_invoice_balance) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(day, totals.get("processed_count", 0), totals.get("error_count", 0),
+                  totals.get("total_time", 0.0), totals.get("total_invoice_balance", 0.0))
+                 for day, totals in legacy.items()],
+            )
+        logging.info(f"Imported {len(legacy)} days of statistics from {legacy_file}")
+
+    def record_run(self, source: str, status: str, seconds: float, stats: Optional[dict] = None,
+                   pages: int = 0, stages: Optional[Dict[str, float]] = None, input_dir: Optional[str] = None,
+                   error: Optional[str] = None):
+        """Append one run. status is "ok", "mismatch", "error" or "cancelled"; stats is PDFProcessor.stats."""
+        stats = stats or {}
+        day = datetime.now().strftime("%Y-%m-%d")
+        # As before the run log: a run failed if it stopped without merging anything. Cancelling is not a failure.
+        failed = (status not in ("ok", "cancelled") and not stats.get('processed_count')
+                  and not stats.get('skipped_count'))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO runs (day, finished, source, input_dir, status, seconds, pages, documents, skipped, "
+                "invoices, affidavits, bytes_written, bytes_saved, stages, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (day, time.time(), source, input_dir, status, seconds, pages, stats.get('processed_count', 0),
+                 stats.get('skipped_count', 0), stats.get('invoice_count', 0), stats.get('affidavit_count', 0),
+                 stats.get('bytes_written', 0), stats.get('bytes_saved', 0),
+                 json.dumps(stages) if stages else None, error),
+            )
+            self._conn.execute(
+                "INSERT INTO daily (day, run_count, error_count, total_time, pages, documents, bytes_written, "
+                "total_invoice_balance) VALUES (?, 1, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (day) DO UPDATE SET run_count = run_count + 1, "
+                "error_count = error_count + excluded.error_count, total_time = total_time + excluded.total_time, "
+                "pages = pages + excluded.pages, documents = documents + excluded.documents, "
+                "bytes_written = bytes_written + excluded.bytes_written, "
+                "total_invoice_balance = total_invoice_balance + excluded.total_invoice_balance",
+                (day, int(failed), seconds, pages, stats.get('processed_count', 0), stats.get('bytes_written', 0),
+                 stats.get('total_invoice_balance', 0.0)),
+            )
+
+    def get_today_stats(self) -> dict:
+        day = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_count, error_count, total_time, pages, documents, bytes_written, total_invoice_balance "
+                "FROM daily WHERE day = ?", (day,)
+            ).fetchone()
+        run_count, error_count, total_time, pages, documents, bytes_written, balance = row or (0, 0, 0.0, 0, 0, 0, 0.0)
+        return {
+            "processed_count": run_count,
+            "error_count": error_count,
+            "total_time": total_time,
+            "success_rate": (run_count - error_count) / run_count * 100 if run_count else 100.0,
+            "pages": pages,
+            "documents": documents,
+            "bytes_written": bytes_written,
+            "total_invoice_balance": balance,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,7 +1,7 @@
 import os
 import re
-from PyPDF2 import PdfReader
 from typing import List
+from utils.pdf_cache import open_pdf
 
 class FileValidator:
     @staticmethod
@@ -21,10 +21,10 @@ class FileValidator:
         return errors
     
     @staticmethod
-    def validate_pdf_structure(pdf_path):
+    def validate_pdf_structure(pdf_path, low_memory=False):
         try:
-            reader = PdfReader(pdf_path)
-            if len(reader.pages) == 0:
+            # Parsed through the shared cache so the scan and merge reuse this parse.
+            if open_pdf(pdf_path, low_memory=low_memory).page_count == 0:
                 return f"PDF file {pdf_path} has no pages"
         except Exception as e:
             return f"Error reading {pdf_path}: {str(e)}"
@@ -0,0 +1,179 @@
+# watch.py
+"""
+Watch mode: merge invoices and affidavits as soon as the billing export drops them into a folder.
+
+The folders are polled with os.scandir, which costs a few stat calls per second. A folder's files
+are grouped by month, like a glob on the command line (see cli.discover_jobs): every invoice and
+affidavit part of a month goes into one job, as documents are paired by number across parts. A
+month is processed once both sides are there and its files have kept the same sizes and
+modification times for --settle seconds, so half-written exports are never picked up. It is
+processed again whenever one of its files is added or changes.
+Jobs run in a pool of long-lived worker processes. Each worker keeps PyPDF2 imported and its
+parsed files cached between jobs. Runs are incremental, so a re-export only rewrites the
+documents that changed.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from cli import _init_worker, discover_jobs, run_job
+from utils.stats import STATS_FILE
+
+POLL_INTERVAL = 1.0
+SETTLE_SECONDS = 2.0
+
+
+def _warm_worker(log_level: int):
+    _init_worker(log_level)
+    # Imported once per worker process, not once per job.
+    import pdf_processor  # noqa: F401
+
+
+class FolderWatcher:
+    """Tracks the months of invoices and affidavits in some folders and reports each settled new or changed one once."""
+
+    def __init__(self, folders: List[str], output_root: Optional[str] = None, settle: float = SETTLE_SECONDS):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.output_root = output_root
+        self.settle = settle
+        # Months are keyed by their job's output folder, which stays the same as parts are added.
+        # Month -> signature its files were last handed out with.
+        self._processed: Dict[str, tuple] = {}
+        # Month -> (signature, time it was first seen with that signature).
+        self._changing: Dict[str, Tuple[tuple, float]] = {}
+
+    def _signature(self, files: Tuple[str, ...]) -> Optional[tuple]:
+        try:
+            return tuple((path, stat.st_size, stat.st_mtime_ns) for path, stat in zip(files, map(os.stat, files)))
+        except OSError:
+            # Renamed or deleted between the listing and the stat; look again next poll.
+            return None
+
+    def forget(self, job: dict):
+        """Hand job's month out again once it has settled, e.g. because it could not be started this time."""
+        self._processed.pop(job['output_dir'], None)
+
+    def mark_current(self):
+        """Treat every month's current files as processed, so only later exports are picked up."""
+        for job in self._jobs():
+            self._processed[job['output_dir']] = self._signature(job['input_files'])
+
+    def _jobs(self) -> List[dict]:
+        jobs = []
+        for folder in self.folders:
+            with os.scandir(folder) as entries:
+                if not any(entry.name.lower().endswith('.pdf') for entry in entries):
+                    continue
+            # A month with only one side is reported as an error by discover_jobs; here it is just not ready yet.
+            jobs.extend(job for job in discover_jobs([os.path.join(folder, "*.pdf")], self.output_root)
+                        if not job.get('error'))
+        return jobs
+
+    def poll(self, now: Optional[float] = None) -> List[dict]:
+        """Return the jobs whose files have settled since they were last processed."""
+        now = time.monotonic() if now is None else now
+        ready = []
+        for job in self._jobs():
+            month = job['output_dir']
+            signature = self._signature(job['input_files'])
+            if signature is None or self._processed.get(month) == signature:
+                self._changing.pop(month, None)
+                continue
+            first_seen = self._changing.get(month)
+            if first_seen is None or first_seen[0] != signature:
+                self._changing[month] = (signature, now)
+                if self.settle > 0:
+                    continue
+            elif now - first_seen[1] < self.settle:
+                continue
+            del self._changing[month]
+            self._processed[month] = signature
+            ready.append(job)
+        return ready
+
+
+def _report(message: str):
+    print(f"{time.strftime('%H:%M:%S')} {message}", file=sys.stderr, flush=True)
+
+
+def _report_result(result: dict):
+    message = (f"[{result['status']}] {result['input_dir']}: {result.get('processed_count', 0)} written, "
+               f"{result.get('skipped_count', 0)} up to date, {result['pages']} pages in {result['seconds']:.1f}s")
+    if result.get('error'):
+        message += f" - {result['error']}"
+    _report(message)
+
+
+def watch(folders: List[str], options: dict, output_root: Optional[str] = None, jobs: int = 1,
+          poll_interval: float = POLL_INTERVAL, settle: float = SETTLE_SECONDS, new_only: bool = False,
+          stats_file: Optional[str] = None):
+    watcher = FolderWatcher(folders, output_root, settle)
+    if new_only:
+        watcher.mark_current()
+    log_level = logging.getLogger().getEffectiveLevel()
+    running: Dict[str, Future] = {}
+    _report(f"Watching {', '.join(watcher.folders)} for invoices and affidavits (Ctrl+C to stop)")
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker, initargs=(log_level,)) as executor:
+        try:
+            while True:
+                for month, future in list(running.items()):
+                    if future.done():
+                        del running[month]
+                        _report_result(future.result())
+                for job in watcher.poll():
+                    if job['output_dir'] in running:
+                        # Still merging the previous export of this month; the next polls retry this one.
+                        watcher.forget(job)
+                        continue
+                    _report(f"Processing {len(job['input_files'])} files in {job['input_dir']}")
+                    running[job['output_dir']] = executor.submit(run_job, job, options, stats_file, "watch")
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            _report("Stopping; waiting for running jobs to finish.")
+            for future in running.values():
+                future.cancel()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folders', nargs='+', help="folders the invoice and affidavit PDFs are exported to")
+    parser.add_argument('--output-root', help="write each month's output under this folder")
+    parser.add_argument('--jobs', type=int, default=1, help="months processed at once")
+    parser.add_argument('--workers', type=int, default=1, help="extraction processes per job")
+    parser.add_argument('--writer-workers', type=int, default=1, help="writer processes per job")
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL, help="seconds between folder scans")
+    parser.add_argument('--settle', type=float, default=SETTLE_SECONDS,
+                        help="seconds a month's files must stay unchanged before they are processed")
+    parser.add_argument('--new-only', action='store_true', help="ignore the files already in the folders")
+    parser.add_argument('--ignore-mismatches', action='store_true', help="merge the common documents anyway")
+    parser.add_argument('--fast', action='store_true', help="fast header-region document-number detection")
+    parser.add_argument('--optimize', action='store_true', help="deduplicate resources in merged outputs")
+    parser.add_argument('--stats-file', default=STATS_FILE,
+                        help="run log shared with the GUI (default: %(default)s)")
+    parser.add_argument('--no-stats', action='store_true', help="do not record the runs in the stats file")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    _init_worker(logging.INFO if args.verbose else logging.WARNING)
+    options = {
+        'ignore_mismatches': args.ignore_mismatches,
+        'workers': args.workers,
+        'writer_workers': args.writer_workers,
+        'fast_detection': args.fast,
+        'optimize_output': args.optimize,
+        'compress_content': args.optimize,
+        'incremental': True,
+    }
+    watch(args.folders, options, args.output_root, max(1, args.jobs), args.poll_interval, args.settle, args.new_only,
+          None if args.no_stats else args.stats_file)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())